@@ -6,13 +6,26 @@ import os
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./team_balance.db")
 
-# SQLite-specific configuration
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite specific
-    poolclass=StaticPool,  # Keep connection alive
-    echo=bool(os.getenv("DEBUG", False))  # Log SQL queries in debug mode
-)
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite-specific configuration
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},  # SQLite specific
+        poolclass=StaticPool,  # Keep connection alive
+        query_cache_size=1200,  # Room for every compiled statement the API issues
+        echo=bool(os.getenv("DEBUG", False))  # Log SQL queries in debug mode
+    )
+else:
+    # Networked databases: pooled connections, validated on checkout
+    engine = create_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,  # Replace connections dropped by idle timeouts or server restarts
+        pool_size=int(os.getenv("DB_POOL_SIZE", 20)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        pool_recycle=1800,  # Recycle before typical server-side idle limits
+        query_cache_size=1200,  # Room for every compiled statement the API issues
+        echo=bool(os.getenv("DEBUG", False))  # Log SQL queries in debug mode
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Float, Integer, DateTime, Enum, Boolean, ForeignKey, ForeignKeyConstraint, TypeDecorator, CHAR
+from sqlalchemy import Column, BigInteger, String, Float, Integer, DateTime, Enum, Boolean, ForeignKey, ForeignKeyConstraint, Index, TypeDecorator, CHAR
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import uuid
@@ -87,6 +87,12 @@ class User(Base):
     
     # Relationships
     match_participations = relationship("MatchPlayer", back_populates="user")
+    
+    # Indexes
+    __table_args__ = (
+        Index('ix_users_guild_deleted_user', 'guild_id', 'deleted_at', 'user_id'),  # Active guild members, paged by user_id
+        Index('ix_users_guild_deleted_rating', 'guild_id', 'deleted_at', 'rating_mu'),  # Active guild members in leaderboard (rating) order
+    )
 
 class Match(Base):
     __tablename__ = "matches"
@@ -95,7 +101,7 @@ class Match(Base):
     match_id = Column(GUID(), primary_key=True, default=uuid.uuid4)
     
     # Match Context
-    guild_id = Column(BigInteger, nullable=False, index=True)
+    guild_id = Column(BigInteger, nullable=False)  # Lookups use the ix_matches_guild_status_created prefix
     created_by = Column(BigInteger, nullable=False)
     
     # Match Timing
@@ -113,6 +119,12 @@ class Match(Base):
     
     # Relationships
     players = relationship("MatchPlayer", back_populates="match", cascade="all, delete-orphan")
+    
+    # Indexes
+    __table_args__ = (
+        Index('ix_matches_guild_status_created', 'guild_id', 'status', 'created_at'),  # Completed/pending match lookups per guild, newest first
+        Index('ix_matches_status_match', 'status', 'match_id'),  # Index-only COMPLETED check when joining from match_players
+    )
 
 class MatchPlayer(Base):
     __tablename__ = "match_players"
@@ -139,7 +151,9 @@ class MatchPlayer(Base):
     match = relationship("Match", back_populates="players")
     user = relationship("User", back_populates="match_participations")
     
-    # Foreign Key Constraint
+    # Foreign Key Constraint and Indexes
     __table_args__ = (
         ForeignKeyConstraint(['guild_id', 'user_id'], ['users.guild_id', 'users.user_id']),
+        Index('ix_match_players_match_team', 'match_id', 'team_number'),  # Team roster lookups within a match
+        Index('ix_match_players_guild_user_match', 'guild_id', 'user_id', 'match_id', 'result'),  # Per-user match history; covers the completed-stats aggregate
     )
\ No newline at end of file
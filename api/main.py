@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from database.connection import create_tables
 from routes import users, matches
 from utils.version import get_version_string, get_version_dict, print_startup_version
@@ -11,7 +12,8 @@ version_info = get_version_dict()
 app = FastAPI(
     title="Discord Team Balance Bot API",
     description="REST API for team balancing and match tracking",
-    version=version_info["version"]
+    version=version_info["version"],
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for Discord bot integration
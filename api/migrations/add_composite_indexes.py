@@ -0,0 +1,60 @@
+"""Add composite indexes for hot match and player lookups
+
+This migration creates the indexes declared on the models (e.g. ix_users_guild_deleted_user,
+ix_users_guild_deleted_rating, ix_matches_guild_status_created, ix_matches_status_match, ix_match_players_match_team,
+ix_match_players_guild_user_match) on databases whose tables were created before they existed.
+create_all() does not add indexes to tables that already exist.
+
+Usage:
+    python add_composite_indexes.py
+
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def get_database_url():
+    """Get database URL from environment or use default"""
+    return os.getenv("DATABASE_URL", "sqlite:///./team_balance.db")
+
+def run_migration():
+    """Create any model-declared indexes that are missing from the database"""
+    from database.models import Base
+    
+    # Get database URL
+    database_url = get_database_url()
+    logger.info(f"Using database: {database_url}")
+    engine = create_engine(database_url)
+    
+    try:
+        # Make sure all tables exist first (new databases get the indexes here)
+        Base.metadata.create_all(bind=engine)
+        
+        inspector = inspect(engine)
+        for table in Base.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            
+            for index in table.indexes:
+                if index.name in existing:
+                    logger.info(f"Index '{index.name}' already exists on {table.name}")
+                    continue
+                
+                logger.info(f"Creating index '{index.name}' on {table.name}...")
+                index.create(bind=engine)
+                logger.info(f"✅ Created index '{index.name}'")
+        
+        logger.info("🎉 Composite index migration complete!")
+        
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    run_migration()
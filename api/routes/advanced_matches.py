@@ -4,13 +4,14 @@ Handles advanced placement results with opponent strength consideration
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from collections import defaultdict
 from typing import Dict, List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 
 from database.connection import get_db
-from database.models import Match, MatchPlayer, User
+from database.models import Match, User
 from services.advanced_rating_service import AdvancedRatingService, TeamData, RatingChangeBreakdown
 
 
@@ -74,21 +75,25 @@ async def record_advanced_placement_result(
     """Record match result using advanced rating system with opponent strength consideration"""
     
     try:
-        # Validate match exists
-        match = db.query(Match).filter(Match.match_id == match_id).first()
+        # Validate match exists, loading its players with it
+        match = db.query(Match).options(joinedload(Match.players)).filter(Match.match_id == match_id).first()
         if not match:
             raise HTTPException(status_code=404, detail="Match not found")
         
         if match.status == "completed":
             raise HTTPException(status_code=400, detail="Match already completed")
         
-        # Get all match players
-        match_players = db.query(MatchPlayer).filter(MatchPlayer.match_id == match_id).all()
+        match_players = match.players
         if not match_players:
             raise HTTPException(status_code=400, detail="No players found in match")
         
+        # Group players by team in one pass
+        players_by_team = defaultdict(list)
+        for mp in match_players:
+            players_by_team[mp.team_number].append(mp)
+        
         # Validate team placements
-        team_numbers = set(mp.team_number for mp in match_players)
+        team_numbers = set(players_by_team)
         provided_teams = set(placement_data.team_placements.keys())
         
         if team_numbers != provided_teams:
@@ -100,7 +105,7 @@ async def record_advanced_placement_result(
         # Calculate team averages if not provided
         team_placement_dict = {}
         for team_num, team_data in placement_data.team_placements.items():
-            team_players = [mp for mp in match_players if mp.team_number == team_num]
+            team_players = players_by_team[team_num]
             
             if team_data.avg_rating is None:
                 # Calculate team average from players
@@ -116,7 +121,8 @@ async def record_advanced_placement_result(
         
         # Apply advanced rating changes
         rating_changes = AdvancedRatingService.apply_advanced_rating_changes(
-            db, str(match_id), team_placement_dict
+            db, str(match_id), team_placement_dict,
+            match=match, players_by_team=players_by_team
         )
         
         # Update match metadata
@@ -130,19 +136,21 @@ async def record_advanced_placement_result(
         
         db.commit()
         
-        # Prepare response
+        # Prepare response, fetching only the usernames it needs in one query
+        usernames = dict(db.query(User.user_id, User.username).filter(
+            User.guild_id == match.guild_id,
+            User.user_id.in_([mp.user_id for mp in match_players])
+        ).all())
+        
         player_changes = []
         for match_player in match_players:
-            user = db.query(User).filter(
-                User.guild_id == match_player.guild_id,
-                User.user_id == match_player.user_id
-            ).first()
+            username = usernames.get(match_player.user_id)
             
             breakdown = rating_changes.get(str(match_player.user_id))
-            if breakdown and user:
+            if breakdown and username is not None:
                 player_changes.append(PlayerRatingChange(
                     user_id=match_player.user_id,
-                    username=user.username,
+                    username=username,
                     rating_before=match_player.rating_mu_before,
                     rating_after=match_player.rating_mu_after,
                     rating_change=breakdown.final_change,
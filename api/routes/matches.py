@@ -1,34 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from database.connection import get_db
 from database.models import User, MatchPlayer, MatchStatus, PlayerResult, ResultType
 from services.match_service import MatchService
 from services.user_service import UserService
-from services.rating_service import GlickoRatingService, Rating
-from schemas.match_schemas import MatchCreate, MatchPlayerCreate, MatchResultUpdate, MatchResponse, MatchPlayerResponse, PlacementResultUpdate
+from services.rating_service import GlickoRatingService
+from schemas.match_schemas import MatchCreate, MatchPlayerCreate, MatchResultUpdate, MatchResponse, MatchPlayerResponse, PlacementResultUpdate, match_to_response, match_player_to_dict
 from typing import List
+from collections import defaultdict
 from uuid import UUID
 from datetime import datetime
 
 router = APIRouter(prefix="/matches", tags=["matches"])
 
+# Static part of the update_match_result response
+_MATCH_RESULT_TEMPLATE = {
+    "message": "Match result updated successfully",
+    "cleanup_performed": True,
+    "note": "Any pending matches for involved players have been automatically cancelled"
+}
+
 @router.post("/", response_model=MatchResponse)
 def create_match(match_data: MatchCreate, db: Session = Depends(get_db)):
     """Create a new match"""
-    return MatchService.create_match(db, match_data)
+    return ORJSONResponse(match_to_response(MatchService.create_match(db, match_data)))
 
 @router.get("/{guild_id}", response_model=List[MatchResponse])
 def get_guild_matches(guild_id: int, limit: int = 50, db: Session = Depends(get_db)):
     """Get guild's match history"""
-    return MatchService.get_guild_matches(db, guild_id, limit)
+    matches = MatchService.get_guild_matches(db, guild_id, limit)
+    return ORJSONResponse([match_to_response(match) for match in matches])
 
 @router.get("/match/{match_id}", response_model=MatchResponse)
 def get_match(match_id: UUID, db: Session = Depends(get_db)):
     """Get specific match details"""
-    match = MatchService.get_match(db, match_id)
+    match = MatchService.get_match(db, match_id, load_players=True)
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
-    return match
+    return ORJSONResponse(match_to_response(match))
 
 @router.post("/{match_id}/players", response_model=MatchPlayerResponse)
 def add_player_to_match(match_id: UUID, player_data: MatchPlayerCreate, db: Session = Depends(get_db)):
@@ -36,12 +46,17 @@ def add_player_to_match(match_id: UUID, player_data: MatchPlayerCreate, db: Sess
     match_player = MatchService.add_player_to_match(db, match_id, player_data)
     if not match_player:
         raise HTTPException(status_code=404, detail="User not found")
-    return match_player
+    
+    # Serialize from the flushed row before commit expires it
+    response = ORJSONResponse(match_player_to_dict(match_player))
+    db.commit()
+    return response
 
 @router.get("/{match_id}/players", response_model=List[MatchPlayerResponse])
 def get_match_players(match_id: UUID, db: Session = Depends(get_db)):
     """Get all players in match"""
-    return MatchService.get_match_players(db, match_id)
+    players = MatchService.get_match_players(db, match_id)
+    return ORJSONResponse([match_player_to_dict(player) for player in players])
 
 @router.put("/{match_id}/result")
 def update_match_result(match_id: UUID, result_data: MatchResultUpdate, db: Session = Depends(get_db)):
@@ -50,8 +65,14 @@ def update_match_result(match_id: UUID, result_data: MatchResultUpdate, db: Sess
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    # Get players involved in this match before updating
-    players = MatchService.get_match_players(db, match_id)
+    # Get players involved in this match before updating (rating columns only)
+    players = db.query(
+        MatchPlayer.user_id,
+        MatchPlayer.guild_id,
+        MatchPlayer.team_number,
+        MatchPlayer.rating_mu_before,
+        MatchPlayer.rating_sigma_before
+    ).filter(MatchPlayer.match_id == match_id).all()
     player_ids = [p.user_id for p in players]
     
     # Update match result (this includes cleanup of pending matches for these players)
@@ -59,91 +80,56 @@ def update_match_result(match_id: UUID, result_data: MatchResultUpdate, db: Sess
     if not updated_match:
         raise HTTPException(status_code=400, detail="Failed to update match result")
     
-    # Group players by team
-    teams = {}
-    for player in players:
-        if player.team_number not in teams:
-            teams[player.team_number] = []
-        teams[player.team_number].append(player)
-    
-    # Calculate new ratings based on match result
+    # Score every player from their team's outcome
     if result_data.result_type == "win_loss" and result_data.winning_team:
-        # Handle win/loss scenario
-        for team_num, team_players in teams.items():
-            team_ratings = [Rating(p.rating_mu_before, p.rating_sigma_before) for p in team_players]
-            
-            if team_num == result_data.winning_team:
-                # Winning team
-                score = 1.0
-            else:
-                # Losing team
-                score = 0.0
-            
-            # Simple rating update for each player
-            updated_ratings = GlickoRatingService.update_ratings(team_ratings, [score] * len(team_ratings))
-            
-            # Update database
-            for player, new_rating in zip(team_players, updated_ratings):
-                player.rating_mu_after = new_rating.mu
-                player.rating_sigma_after = new_rating.sigma
-                
-                # Update user's current rating (only from COMPLETED matches)
-                UserService.update_user_rating(db, player.guild_id, player.user_id, new_rating.mu, new_rating.sigma)
-                
-                # Update user's stats (legacy - kept for compatibility)
-                result_str = "win" if team_num == result_data.winning_team else "loss"
-                UserService.update_user_stats(db, player.guild_id, player.user_id, result_str)
-    
+        scores = [1.0 if p.team_number == result_data.winning_team else 0.0 for p in players]
+        stat_results = ["win" if score == 1.0 else "loss" for score in scores]
     elif result_data.result_type == "draw":
-        # Handle draw scenario
-        for team_num, team_players in teams.items():
-            team_ratings = [Rating(p.rating_mu_before, p.rating_sigma_before) for p in team_players]
-            updated_ratings = GlickoRatingService.update_ratings(team_ratings, [0.5] * len(team_ratings))
-            
-            # Update database
-            for player, new_rating in zip(team_players, updated_ratings):
-                player.rating_mu_after = new_rating.mu
-                player.rating_sigma_after = new_rating.sigma
-                
-                # Update user's current rating (only from COMPLETED matches)
-                UserService.update_user_rating(db, player.guild_id, player.user_id, new_rating.mu, new_rating.sigma)
-                
-                # Update user's stats (legacy - kept for compatibility)
-                UserService.update_user_stats(db, player.guild_id, player.user_id, "draw")
-    
+        scores = [0.5] * len(players)
+        stat_results = ["draw"] * len(players)
     elif result_data.result_type == "forfeit":
-        # Handle forfeit scenario - all players lose, small rating decrease
-        for team_num, team_players in teams.items():
-            team_ratings = [Rating(p.rating_mu_before, p.rating_sigma_before) for p in team_players]
-            # Use 0.25 score for forfeit (worse than draw, but not as bad as full loss)
-            updated_ratings = GlickoRatingService.update_ratings(team_ratings, [0.25] * len(team_ratings))
-            
-            # Update database
-            for player, new_rating in zip(team_players, updated_ratings):
-                player.rating_mu_after = new_rating.mu
-                player.rating_sigma_after = new_rating.sigma
-                
-                # Update user's current rating (only from COMPLETED matches)
-                UserService.update_user_rating(db, player.guild_id, player.user_id, new_rating.mu, new_rating.sigma)
-                
-                # Update user's stats (legacy - kept for compatibility)
-                UserService.update_user_stats(db, player.guild_id, player.user_id, "loss")
+        # Use 0.25 score for forfeit (worse than draw, but not as bad as full loss)
+        scores = [0.25] * len(players)
+        stat_results = ["loss"] * len(players)
+    else:
+        scores = None
+    
+    if scores is not None:
+        # Calculate new ratings for the whole match in one pass over the rating columns
+        new_mus, new_sigmas = GlickoRatingService.update_ratings_vec(
+            [p.rating_mu_before for p in players],
+            [p.rating_sigma_before for p in players],
+            scores
+        )
+        
+        db.bulk_update_mappings(MatchPlayer, [
+            {
+                'match_id': match_id,
+                'user_id': player.user_id,
+                'rating_mu_after': new_mu,
+                'rating_sigma_after': new_sigma
+            }
+            for player, new_mu, new_sigma in zip(players, new_mus, new_sigmas)
+        ])
+        
+        # Update users' current ratings and legacy stats (only from COMPLETED matches) in one executemany
+        UserService.apply_match_outcomes(db, match.guild_id, [
+            (player.user_id, new_mu, new_sigma, result_str)
+            for player, new_mu, new_sigma, result_str in zip(players, new_mus, new_sigmas, stat_results)
+        ])
     
     db.commit()
+    if scores is not None:
+        UserService.invalidate_cached_users(match.guild_id, player_ids)
     
-    # Return success message with cleanup info
-    cleanup_count = 0  # The cleanup was already done in update_match_result
-    return {
-        "message": "Match result updated successfully",
-        "cleanup_performed": True,
-        "players_involved": len(player_ids),
-        "note": "Any pending matches for involved players have been automatically cancelled"
-    }
+    # Return success message with cleanup info (cleanup was already done in update_match_result)
+    return {**_MATCH_RESULT_TEMPLATE, "players_involved": len(player_ids)}
 
 @router.get("/{guild_id}/completed", response_model=List[MatchResponse])
 def get_guild_completed_matches(guild_id: int, limit: int = 50, db: Session = Depends(get_db)):
     """Get only completed matches for a guild (for statistics and ratings)"""
-    return MatchService.get_guild_completed_matches(db, guild_id, limit)
+    matches = MatchService.get_guild_completed_matches(db, guild_id, limit)
+    return ORJSONResponse([match_to_response(match) for match in matches])
 
 @router.get("/user/{guild_id}/{user_id}/completed")
 def get_user_completed_match_history(guild_id: int, user_id: int, limit: int = 20, db: Session = Depends(get_db)):
@@ -161,7 +147,8 @@ def cancel_match(match_id: UUID, db: Session = Depends(get_db)):
 @router.get("/user/{guild_id}/{user_id}/history", response_model=List[MatchPlayerResponse])
 def get_user_match_history(guild_id: int, user_id: int, limit: int = 20, db: Session = Depends(get_db)):
     """Get match history for a specific user"""
-    return MatchService.get_user_match_history(db, guild_id, user_id, limit)
+    history = MatchService.get_user_match_history(db, guild_id, user_id, limit)
+    return ORJSONResponse([match_player_to_dict(player) for player in history])
 
 @router.put("/{match_id}/placement-result")
 def record_placement_result(match_id: str, placement_data: PlacementResultUpdate, db: Session = Depends(get_db)):
@@ -171,23 +158,21 @@ def record_placement_result(match_id: str, placement_data: PlacementResultUpdate
         team_placements = placement_data.team_placements
         
         # Validate match exists and is pending
-        match = MatchService.get_match(db, match_id)
+        match = MatchService.get_match_with_players(db, match_id)
         if not match:
             raise HTTPException(status_code=404, detail="Match not found")
         
         if match.status != MatchStatus.PENDING:
             raise HTTPException(status_code=400, detail="Match is not in pending status")
         
-        # Get all players in the match
-        players = db.query(MatchPlayer).filter(MatchPlayer.match_id == match_id).all()
+        # All players in the match were loaded with it
+        players = match.players
         if not players:
             raise HTTPException(status_code=404, detail="No players found for this match")
         
-        # Group players by team
-        teams = {}
+        # Group players by team in one pass
+        teams = defaultdict(list)
         for player in players:
-            if player.team_number not in teams:
-                teams[player.team_number] = []
             teams[player.team_number].append(player)
         
         # Validate team_placements
@@ -204,30 +189,49 @@ def record_placement_result(match_id: str, placement_data: PlacementResultUpdate
         if set(team_placements_int.keys()) != set(teams.keys()):
             raise HTTPException(status_code=400, detail="All teams must have placements")
         
-        # Validate placements are unique and within valid range
-        placements = list(team_placements_int.values())
-        if len(set(placements)) != len(placements):
-            raise HTTPException(status_code=400, detail="All placements must be unique")
+        # Validate placements are unique and within valid range, tracking min/max/sum in one pass
+        seen_placements = set()
+        min_placement = max_placement = next(iter(team_placements_int.values()))
+        placement_sum = 0
+        for placement in team_placements_int.values():
+            if placement in seen_placements:
+                raise HTTPException(status_code=400, detail="All placements must be unique")
+            seen_placements.add(placement)
+            if placement < min_placement:
+                min_placement = placement
+            elif placement > max_placement:
+                max_placement = placement
+            placement_sum += placement
         
         # Check valid range (1-30)
-        if min(placements) < 1:
+        if min_placement < 1:
             raise HTTPException(status_code=400, detail="Placements must be 1 or higher")
         
-        if max(placements) > 30:
+        if max_placement > 30:
             raise HTTPException(status_code=400, detail="Maximum supported placement is 30")
         
         # Determine if this is a guild-only match or external competition
-        max_placement = max(placements)
-        is_guild_only = max_placement <= len(teams)
+        num_teams = len(teams)
+        is_guild_only = max_placement <= num_teams
         
         if is_guild_only:
             # Guild-only match: require consecutive placements
-            expected_placements = set(range(1, len(teams) + 1))
-            if set(placements) != expected_placements:
-                raise HTTPException(status_code=400, detail=f"Guild matches must use placements 1 through {len(teams)}")
+            if min_placement != 1 or placement_sum != num_teams * (num_teams + 1) // 2:
+                raise HTTPException(status_code=400, detail=f"Guild matches must use placements 1 through {num_teams}")
         # External competitions: allow any unique placements 1-30
         
-        # Calculate rating changes and update players
+        # Load every participant's current rating in one query
+        ratings = {
+            user_id: (rating_mu, rating_sigma)
+            for user_id, rating_mu, rating_sigma in db.query(User.user_id, User.rating_mu, User.rating_sigma).filter(
+                User.guild_id == match.guild_id,
+                User.user_id.in_([player.user_id for player in players])
+            )
+        }
+        
+        # Calculate rating changes and collect player/user updates
+        match_player_updates = []
+        outcomes = []
         for team_num, placement in team_placements_int.items():
             team_players = teams[team_num]
             
@@ -244,42 +248,31 @@ def record_placement_result(match_id: str, placement_data: PlacementResultUpdate
             
             # Update each player in the team
             for player in team_players:
-                # Get user for rating calculation
-                user = db.query(User).filter(
-                    User.guild_id == player.guild_id,
-                    User.user_id == player.user_id
-                ).first()
-                
-                if not user:
+                rating = ratings.get(player.user_id)
+                if not rating:
                     continue
+                rating_mu, rating_sigma = rating
                 
                 # Calculate new rating using simplified approach
-                old_mu = user.rating_mu
-                old_sigma = user.rating_sigma
-                
-                # Apply rating change
-                new_mu = max(100, min(3000, old_mu + rating_change))  # Clamp between 100-3000
-                new_sigma = max(50, old_sigma * 0.99)  # Slightly reduce uncertainty
+                new_mu = max(100, min(3000, rating_mu + rating_change))  # Clamp between 100-3000
+                new_sigma = max(50, rating_sigma * 0.99)  # Slightly reduce uncertainty
                 
                 # Update player record
-                player.team_placement = placement
-                player.rating_mu_after = new_mu
-                player.rating_sigma_after = new_sigma
-                player.result = result
+                match_player_updates.append({
+                    'match_id': player.match_id,
+                    'user_id': player.user_id,
+                    'team_placement': placement,
+                    'rating_mu_after': new_mu,
+                    'rating_sigma_after': new_sigma,
+                    'result': result
+                })
                 
-                # Update user rating
-                user.rating_mu = new_mu
-                user.rating_sigma = new_sigma
-                
-                # Update user statistics
-                if result == PlayerResult.WIN:
-                    user.wins += 1
-                elif result == PlayerResult.LOSS:
-                    user.losses += 1
-                else:
-                    user.draws += 1
-                
-                user.games_played += 1
+                # Update user rating and statistics
+                outcomes.append((player.user_id, new_mu, new_sigma, result.value))
+        
+        # Write all player and user changes with one executemany per table
+        db.bulk_update_mappings(MatchPlayer, match_player_updates)
+        UserService.apply_match_outcomes(db, match.guild_id, outcomes)
         
         # Update match status
         match.status = MatchStatus.COMPLETED
@@ -294,8 +287,9 @@ def record_placement_result(match_id: str, placement_data: PlacementResultUpdate
                 break
         match.winning_team = winning_team
         
-        # Commit all changes
+        # Commit all changes, then drop the participants' cached reads
         db.commit()
+        UserService.invalidate_cached_users(match.guild_id, [outcome[0] for outcome in outcomes])
         
         return {"message": "Placement results recorded successfully"}
         
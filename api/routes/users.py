@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from database.connection import get_db
 from services.user_service import UserService
-from schemas.user_schemas import UserCreate, UserUpdate, UserResponse
-from typing import List
+from schemas.user_schemas import UserCreate, UserUpdate, UserResponse, user_to_response
+from typing import List, Optional
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -14,18 +15,23 @@ def create_user(user_data: UserCreate, db: Session = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
     
-    return UserService.create_user(db, user_data)
+    return ORJSONResponse(user_to_response(UserService.create_user(db, user_data)))
 
 @router.get("/{guild_id}", response_model=List[UserResponse])
-def get_guild_users(guild_id: int, db: Session = Depends(get_db)):
-    """Get all users in a guild"""
-    return UserService.get_guild_users(db, guild_id)
+def get_guild_users(guild_id: int, limit: int = 200, after_user_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Get users in a guild, one page at a time ordered by user_id
+    A full page carries an X-Next-Cursor header; pass it as after_user_id for the next page
+    """
+    users = UserService.get_guild_user_responses(db, guild_id, limit, after_user_id)
+    headers = {"X-Next-Cursor": str(users[-1]["user_id"])} if users and len(users) == limit else None
+    return ORJSONResponse(users, headers=headers)
 
 # Put specific routes with literal strings BEFORE parameterized routes
 @router.get("/{guild_id}/completed-stats")
-def get_guild_users_completed_stats(guild_id: int, db: Session = Depends(get_db)):
-    """Get all users in a guild with statistics based only on COMPLETED matches"""
-    return UserService.get_guild_users_with_completed_stats(db, guild_id)
+def get_guild_users_completed_stats(guild_id: int, limit: Optional[int] = None, offset: int = 0, db: Session = Depends(get_db)):
+    """Get users in a guild with statistics based only on COMPLETED matches (pass limit/offset for a leaderboard page)"""
+    return UserService.get_guild_users_with_completed_stats(db, guild_id, limit, offset)
 
 @router.get("/{guild_id}/{user_id}/completed-stats")
 def get_user_completed_stats(guild_id: int, user_id: int, db: Session = Depends(get_db)):
@@ -44,19 +50,19 @@ def get_user_teammate_stats(guild_id: int, user_id: int, limit: int = 10, db: Se
 @router.get("/{guild_id}/{user_id}/rating")
 def get_user_rating(guild_id: int, user_id: int, db: Session = Depends(get_db)):
     """Get user's current rating"""
-    user = UserService.get_user(db, guild_id, user_id)
-    if not user:
+    rating = UserService.get_user_rating(db, guild_id, user_id)
+    if not rating:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"rating_mu": user.rating_mu, "rating_sigma": user.rating_sigma}
+    return rating
 
 # Generic parameterized routes come AFTER specific routes
 @router.get("/{guild_id}/{user_id}", response_model=UserResponse)
 def get_user(guild_id: int, user_id: int, db: Session = Depends(get_db)):
     """Get specific user"""
-    user = UserService.get_user(db, guild_id, user_id)
+    user = UserService.get_user_response(db, guild_id, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return ORJSONResponse(user)
 
 @router.put("/{guild_id}/{user_id}", response_model=UserResponse)
 def update_user(guild_id: int, user_id: int, update_data: UserUpdate, db: Session = Depends(get_db)):
@@ -64,7 +70,7 @@ def update_user(guild_id: int, user_id: int, update_data: UserUpdate, db: Sessio
     user = UserService.update_user(db, guild_id, user_id, update_data)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return ORJSONResponse(user_to_response(user))
 
 @router.put("/{guild_id}/{user_id}/rating", response_model=UserResponse)
 def update_user_rating_put(guild_id: int, user_id: int, new_mu: float, new_sigma: float, db: Session = Depends(get_db)):
@@ -72,7 +78,7 @@ def update_user_rating_put(guild_id: int, user_id: int, new_mu: float, new_sigma
     user = UserService.update_user_rating(db, guild_id, user_id, new_mu, new_sigma)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return ORJSONResponse(user_to_response(user))
 
 @router.delete("/{guild_id}/{user_id}")
 def delete_user(guild_id: int, user_id: int, db: Session = Depends(get_db)):
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
@@ -30,8 +30,7 @@ class MatchPlayerResponse(BaseModel):
     rating_sigma_after: Optional[float]
     result: str
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class MatchPlayerWithDateResponse(BaseModel):
     user_id: int
@@ -48,8 +47,7 @@ class MatchPlayerWithDateResponse(BaseModel):
     status: str
     result_type: Optional[str]
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class MatchResponse(BaseModel):
     match_id: UUID
@@ -63,5 +61,45 @@ class MatchResponse(BaseModel):
     total_teams: int
     players: List[MatchPlayerResponse] = []
     
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+def match_player_to_response(player) -> MatchPlayerResponse:
+    """Build a MatchPlayerResponse from a MatchPlayer row without re-validation"""
+    return MatchPlayerResponse.model_construct(
+        user_id=player.user_id,
+        guild_id=player.guild_id,
+        team_number=player.team_number,
+        rating_mu_before=player.rating_mu_before,
+        rating_sigma_before=player.rating_sigma_before,
+        rating_mu_after=player.rating_mu_after,
+        rating_sigma_after=player.rating_sigma_after,
+        result=player.result.value
+    )
+
+def match_player_to_dict(player) -> dict:
+    """Plain MatchPlayerResponse-shaped dict for a MatchPlayer row (no Pydantic on the response path)"""
+    return {
+        'user_id': player.user_id,
+        'guild_id': player.guild_id,
+        'team_number': player.team_number,
+        'rating_mu_before': player.rating_mu_before,
+        'rating_sigma_before': player.rating_sigma_before,
+        'rating_mu_after': player.rating_mu_after,
+        'rating_sigma_after': player.rating_sigma_after,
+        'result': player.result.value
+    }
+
+def match_to_response(match) -> dict:
+    """Serialize a Match row (with players) as a MatchResponse payload (trusted DB data, skips validation)"""
+    return MatchResponse.model_construct(
+        match_id=match.match_id,
+        guild_id=match.guild_id,
+        created_by=match.created_by,
+        start_time=match.start_time,
+        end_time=match.end_time,
+        status=match.status.value,
+        result_type=match.result_type.value if match.result_type else None,
+        winning_team=match.winning_team,
+        total_teams=match.total_teams,
+        players=[match_player_to_response(player) for player in match.players]
+    ).model_dump(mode="json")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from datetime import datetime
 
@@ -26,5 +26,21 @@ class UserResponse(BaseModel):
     created_at: datetime
     last_updated: datetime
     
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+def user_to_response(user) -> dict:
+    """Serialize a User row as a UserResponse payload (trusted DB data, skips validation)"""
+    return UserResponse.model_construct(
+        guild_id=user.guild_id,
+        user_id=user.user_id,
+        username=user.username,
+        region_code=user.region_code,
+        rating_mu=user.rating_mu,
+        rating_sigma=user.rating_sigma,
+        games_played=user.games_played,
+        wins=user.wins,
+        losses=user.losses,
+        draws=user.draws,
+        created_at=user.created_at,
+        last_updated=user.last_updated
+    ).model_dump(mode="json")
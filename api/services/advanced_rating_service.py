@@ -4,24 +4,33 @@ Implements opponent strength consideration, curved scaling, and enhanced penalty
 """
 
 import math
+from collections import defaultdict
+from bisect import bisect_left, bisect_right
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from database.models import User, Match, MatchPlayer, PlayerResult
+from services.user_service import UserService
 
 
-@dataclass
+@dataclass(frozen=True)
 class TeamData:
     """Team data for rating calculations"""
+    __slots__ = ('team_number', 'placement', 'avg_rating', 'players')
+    
     team_number: int
     placement: int
     avg_rating: float
     players: List[Dict]
 
 
-@dataclass
+@dataclass(frozen=True)
 class RatingChangeBreakdown:
     """Detailed breakdown of rating change calculation"""
+    __slots__ = ('base_score', 'opponent_multiplier', 'individual_adjustment', 'curve_multiplier',
+                 'preliminary_change', 'final_change', 'max_change_limit')
+    
     base_score: float
     opponent_multiplier: float
     individual_adjustment: float
@@ -31,6 +40,25 @@ class RatingChangeBreakdown:
     max_change_limit: float
 
 
+def _build_placement_table(placement_scores: Dict[int, float]) -> Tuple[float, ...]:
+    """Expand the sparse placement score dict into a dense tuple indexed by placement (index 0 mirrors 1st place)"""
+    ranks = sorted(placement_scores)
+    table = [placement_scores[ranks[0]]]
+    
+    for lower_rank, upper_rank in zip(ranks, ranks[1:]):
+        lower_score = placement_scores[lower_rank]
+        upper_score = placement_scores[upper_rank]
+        table.append(lower_score)
+        
+        # Linear interpolation for ranks not explicitly defined
+        for placement in range(lower_rank + 1, upper_rank):
+            ratio = (placement - lower_rank) / (upper_rank - lower_rank)
+            table.append(lower_score + (upper_score - lower_score) * ratio)
+    
+    table.append(placement_scores[ranks[-1]])
+    return tuple(table)
+
+
 class AdvancedRatingService:
     """Advanced rating service with opponent strength and curved scaling"""
     
@@ -77,36 +105,57 @@ class AdvancedRatingService:
         30: -345  # 30th place (maximum penalty)
     }
     
-    @classmethod
-    def calculate_base_placement_score(cls, placement: int) -> float:
-        """Get base score for placement with interpolation for missing ranks"""
-        if placement in cls.PLACEMENT_SCORES:
-            return cls.PLACEMENT_SCORES[placement]
-        
-        # Interpolate for ranks not explicitly defined
-        return cls._interpolate_placement_score(placement)
+    # Opponent strength multipliers, indexed by bisecting (avg opponent - team avg) into the edges
+    _STRENGTH_EDGES = (-500, -300, -150, -50, 50, 150, 300, 500)
+    _STRENGTH_MULTIPLIERS = (
+        0.2,  # Extremely weak opponents
+        0.4,  # Much weaker opponents
+        0.6,  # Weaker opponents
+        0.8,  # Slightly weaker
+        1.0,  # Similar strength
+        1.2,  # Slightly stronger
+        1.4,  # Strong opponents
+        1.8,  # Very strong opponents
+        2.2   # Much stronger opponents
+    )
+    
+    # Individual adjustments, indexed by bisecting (player - team avg) into the edges
+    _INDIVIDUAL_EDGES = (-200, -100, 100, 200)
+    _INDIVIDUAL_ADJUSTMENTS = (
+        1.2,  # Much weaker than team (significant skill gap)
+        1.1,  # Weaker than team (being carried)
+        1.0,  # Similar to team
+        0.9,  # Stronger than team
+        0.8   # Much stronger than team (carrying team)
+    )
+    
+    # Rating curve tiers: below average, Intermediate (1400+), Advanced (1600+), Expert (1800+), Elite (2000+)
+    _CURVE_TIER_EDGES = (1400, 1600, 1800, 2000)
+    _CLIMB_MULTIPLIERS = (1.0, 0.85, 0.7, 0.5, 0.3)  # Diminishing returns for climbing
+    _DROP_MULTIPLIERS = (1.0, 1.0, 1.1, 1.3, 1.5)    # Faster drops from the top tiers
+    
+    # Dense lookup built once from PLACEMENT_SCORES (index = placement)
+    _PLACEMENT_TABLE = _build_placement_table(PLACEMENT_SCORES)
+    _MAX_PLACEMENT = len(_PLACEMENT_TABLE) - 1
+    
+    # Tier names, indexed by bisecting the rating into the (inclusive) lower bounds
+    _TIER_EDGES = (1000, 1200, 1400, 1600, 1800, 2000, 2200)
+    _TIER_NAMES = ("Learning", "Novice", "Beginner", "Intermediate", "Advanced", "Expert", "Elite", "Legendary")
+    
+    # Expected team rating by rank: (anchor rank, anchor rating, points per rank) per segment
+    _RANK_EDGES = (1, 5, 15, 30)
+    _RANK_SEGMENTS = (
+        (1, 2200, 0),             # Rank 1 or better
+        (1, 2200, 700 / 4),       # 2200 -> 1500, 175 points per rank
+        (5, 1500, 500 / 10),      # 1500 -> 1000, 50 points per rank
+        (15, 1000, 200 / 15),     # 1000 -> 800, 13.33 points per rank
+        (30, 800, 0)              # Minimum rating
+    )
     
     @classmethod
-    def _interpolate_placement_score(cls, placement: int) -> float:
-        """Interpolate placement score for ranks not in the table"""
-        if placement < 1:
-            return cls.PLACEMENT_SCORES[1]
-        if placement > 30:
-            return cls.PLACEMENT_SCORES[30]
-        
-        # Find surrounding values for interpolation
-        lower_rank = max([rank for rank in cls.PLACEMENT_SCORES.keys() if rank < placement], default=1)
-        upper_rank = min([rank for rank in cls.PLACEMENT_SCORES.keys() if rank > placement], default=30)
-        
-        if lower_rank == upper_rank:
-            return cls.PLACEMENT_SCORES[lower_rank]
-        
-        # Linear interpolation
-        lower_score = cls.PLACEMENT_SCORES[lower_rank]
-        upper_score = cls.PLACEMENT_SCORES[upper_rank]
-        
-        ratio = (placement - lower_rank) / (upper_rank - lower_rank)
-        return lower_score + (upper_score - lower_score) * ratio
+    def calculate_base_placement_score(cls, placement: int) -> float:
+        """Get base score for placement, clamped to the 1st..30th place range"""
+        return cls._PLACEMENT_TABLE[min(max(placement, 1), cls._MAX_PLACEMENT)]
     
     @classmethod
     def calculate_opponent_strength_multiplier(cls, team_avg_rating: float, 
@@ -120,28 +169,20 @@ class AdvancedRatingService:
         opponent_ratings = [team.avg_rating for team in opponent_teams]
         avg_opponent_rating = sum(opponent_ratings) / len(opponent_ratings)
         
+        return cls.calculate_opponent_strength_multiplier_precomputed(
+            team_avg_rating, avg_opponent_rating, placement
+        )
+    
+    @classmethod
+    def calculate_opponent_strength_multiplier_precomputed(cls, team_avg_rating: float,
+                                                           avg_opponent_rating: float,
+                                                           placement: int) -> float:
+        """Calculate multiplier based on opponent strength from an already averaged opponent rating"""
         # Strength difference (positive = facing stronger opponents)
         strength_diff = avg_opponent_rating - team_avg_rating
         
-        # Base multiplier from strength difference
-        if strength_diff > 500:      # Much stronger opponents
-            base_multiplier = 2.2
-        elif strength_diff > 300:    # Very strong opponents
-            base_multiplier = 1.8
-        elif strength_diff > 150:    # Strong opponents
-            base_multiplier = 1.4
-        elif strength_diff > 50:     # Slightly stronger
-            base_multiplier = 1.2
-        elif strength_diff > -50:    # Similar strength
-            base_multiplier = 1.0
-        elif strength_diff > -150:   # Slightly weaker
-            base_multiplier = 0.8
-        elif strength_diff > -300:   # Weaker opponents
-            base_multiplier = 0.6
-        elif strength_diff > -500:   # Much weaker opponents
-            base_multiplier = 0.4
-        else:                        # Extremely weak opponents
-            base_multiplier = 0.2
+        # Base multiplier from strength difference (edges are exclusive lower bounds)
+        base_multiplier = cls._STRENGTH_MULTIPLIERS[bisect_left(cls._STRENGTH_EDGES, strength_diff)]
         
         # Additional placement-based adjustment
         if placement <= 3 and strength_diff < -200:  # Won against much weaker
@@ -155,42 +196,16 @@ class AdvancedRatingService:
     def calculate_individual_adjustment(cls, player_rating: float, team_avg_rating: float) -> float:
         """Adjust based on individual player vs team average"""
         individual_diff = player_rating - team_avg_rating
-        
-        if individual_diff > 200:      # Much stronger than team
-            return 0.8  # Reduced impact (carrying team)
-        elif individual_diff > 100:    # Stronger than team
-            return 0.9
-        elif individual_diff > -100:   # Similar to team
-            return 1.0
-        elif individual_diff > -200:   # Weaker than team  
-            return 1.1  # Slightly increased impact (being carried)
-        else:                          # Much weaker than team
-            return 1.2  # Higher impact (significant skill gap)
+        return cls._INDIVIDUAL_ADJUSTMENTS[bisect_left(cls._INDIVIDUAL_EDGES, individual_diff)]
     
     @classmethod
     def calculate_rating_curve_multiplier(cls, current_rating: float, rating_change: float) -> float:
         """Apply diminishing returns for climbing and faster drops for elite players"""
+        # Tier edges are inclusive lower bounds
+        tier = bisect_right(cls._CURVE_TIER_EDGES, current_rating)
         if rating_change > 0:  # Positive changes (climbing)
-            if current_rating >= 2000:      # Elite tier
-                return 0.3  # Very slow climbing
-            elif current_rating >= 1800:    # Expert tier  
-                return 0.5  # Slow climbing
-            elif current_rating >= 1600:    # Advanced tier
-                return 0.7  # Moderate climbing
-            elif current_rating >= 1400:    # Intermediate tier
-                return 0.85 # Slightly reduced climbing
-            else:                           # Below average
-                return 1.0  # Normal climbing
-                
-        else:  # Negative changes (dropping)
-            if current_rating >= 2000:      # Elite tier
-                return 1.5  # Faster drops from elite
-            elif current_rating >= 1800:    # Expert tier
-                return 1.3  # Faster drops from expert
-            elif current_rating >= 1600:    # Advanced tier  
-                return 1.1  # Slightly faster drops
-            else:                           # Lower tiers
-                return 1.0  # Normal drop rate
+            return cls._CLIMB_MULTIPLIERS[tier]
+        return cls._DROP_MULTIPLIERS[tier]  # Negative changes (dropping)
     
     @classmethod
     def calculate_advanced_rating_change(cls, player_rating: float, team_avg_rating: float, 
@@ -205,10 +220,21 @@ class AdvancedRatingService:
             team_avg_rating, opponent_teams, placement
         )
         
-        # Step 3: Individual skill adjustment
-        individual_adjustment = cls.calculate_individual_adjustment(
-            player_rating, team_avg_rating
+        return cls.calculate_player_rating_change(
+            player_rating, team_avg_rating, base_score, opponent_multiplier
         )
+    
+    @classmethod
+    def calculate_player_rating_change(cls, player_rating: float, team_avg_rating: float,
+                                       base_score: float, opponent_multiplier: float,
+                                       individual_adjustment: Optional[float] = None) -> RatingChangeBreakdown:
+        """Calculate the player-specific steps of a rating change from precomputed team-level factors"""
+        
+        # Step 3: Individual skill adjustment
+        if individual_adjustment is None:
+            individual_adjustment = cls.calculate_individual_adjustment(
+                player_rating, team_avg_rating
+            )
         
         # Step 4: Calculate preliminary change
         preliminary_change = base_score * opponent_multiplier * individual_adjustment
@@ -238,39 +264,13 @@ class AdvancedRatingService:
     @classmethod
     def get_rating_tier_name(cls, rating: float) -> str:
         """Get tier name for a rating"""
-        if rating >= 2200:
-            return "Legendary"
-        elif rating >= 2000:
-            return "Elite"
-        elif rating >= 1800:
-            return "Expert"
-        elif rating >= 1600:
-            return "Advanced"
-        elif rating >= 1400:
-            return "Intermediate"
-        elif rating >= 1200:
-            return "Beginner"
-        elif rating >= 1000:
-            return "Novice"
-        else:
-            return "Learning"
+        return cls._TIER_NAMES[bisect_right(cls._TIER_EDGES, rating)]
     
     @classmethod
     def get_expected_team_rating_for_rank(cls, rank: int) -> float:
         """Convert placement rank to expected team rating"""
-        if rank <= 1:
-            return 2200
-        elif rank <= 5:
-            # Linear interpolation from 2200 to 1500
-            return 2200 - (rank - 1) * (700 / 4)  # 175 points per rank
-        elif rank <= 15:
-            # Linear interpolation from 1500 to 1000  
-            return 1500 - (rank - 5) * (500 / 10)  # 50 points per rank
-        elif rank <= 30:
-            # Linear interpolation from 1000 to 800
-            return 1000 - (rank - 15) * (200 / 15)  # 13.33 points per rank
-        else:
-            return 800  # Minimum rating
+        anchor_rank, anchor_rating, points_per_rank = cls._RANK_SEGMENTS[bisect_left(cls._RANK_EDGES, rank)]
+        return anchor_rating - (rank - anchor_rank) * points_per_rank
     
     @classmethod
     def preview_rating_changes(cls, player_rating: float, team_avg_rating: float, 
@@ -278,9 +278,23 @@ class AdvancedRatingService:
         """Preview rating changes for different placements"""
         previews = {}
         
+        # Opponent average and individual adjustment do not depend on placement
+        if opponent_teams:
+            avg_opponent_rating = sum(team.avg_rating for team in opponent_teams) / len(opponent_teams)
+        individual_adjustment = cls.calculate_individual_adjustment(player_rating, team_avg_rating)
+        
         for placement in [1, 3, 5, 10, 15, 20, 25, 30]:
-            breakdown = cls.calculate_advanced_rating_change(
-                player_rating, team_avg_rating, placement, opponent_teams
+            if opponent_teams:
+                opponent_multiplier = cls.calculate_opponent_strength_multiplier_precomputed(
+                    team_avg_rating, avg_opponent_rating, placement
+                )
+            else:
+                opponent_multiplier = 1.0
+            
+            breakdown = cls.calculate_player_rating_change(
+                player_rating, team_avg_rating,
+                cls.calculate_base_placement_score(placement), opponent_multiplier,
+                individual_adjustment
             )
             previews[placement] = breakdown.final_change
         
@@ -289,35 +303,44 @@ class AdvancedRatingService:
     @classmethod
     def calculate_team_average_rating(cls, db: Session, guild_id: int, user_ids: List[int]) -> float:
         """Calculate average rating for a team"""
-        users = db.query(User).filter(
+        avg_rating = db.query(func.avg(User.rating_mu)).filter(
             User.guild_id == guild_id,
             User.user_id.in_(user_ids)
-        ).all()
+        ).scalar()
         
-        if not users:
+        if avg_rating is None:
             return 1500.0  # Default rating
         
-        total_rating = sum(user.rating_mu for user in users)
-        return total_rating / len(users)
+        return float(avg_rating)
     
     @classmethod
     def apply_advanced_rating_changes(cls, db: Session, match_id: str, 
-                                    team_placements: Dict[int, Dict]) -> Dict[str, RatingChangeBreakdown]:
-        """Apply advanced rating changes to all players in a match"""
-        
-        # Get match and players
-        match = db.query(Match).filter(Match.match_id == match_id).first()
-        if not match:
-            raise ValueError(f"Match {match_id} not found")
-        
-        match_players = db.query(MatchPlayer).filter(MatchPlayer.match_id == match_id).all()
-        if not match_players:
-            raise ValueError(f"No players found for match {match_id}")
+                                    team_placements: Dict[int, Dict],
+                                    match: Optional[Match] = None,
+                                    players_by_team: Optional[Dict[int, List[MatchPlayer]]] = None) -> Dict[str, RatingChangeBreakdown]:
+        """
+        Apply advanced rating changes to all players in a match
+        Callers that already loaded the match and grouped its players can pass them in
+        """
+        
+        if match is None:
+            # Get match and players in a single joined query
+            match = db.query(Match).options(joinedload(Match.players)).filter(Match.match_id == match_id).first()
+            if not match:
+                raise ValueError(f"Match {match_id} not found")
+        
+        if players_by_team is None:
+            if not match.players:
+                raise ValueError(f"No players found for match {match_id}")
+            
+            # Organize players by team in one pass
+            players_by_team = defaultdict(list)
+            for mp in match.players:
+                players_by_team[mp.team_number].append(mp)
         
-        # Organize players by team
         teams_data = {}
         for team_num, team_info in team_placements.items():
-            team_players = [mp for mp in match_players if mp.team_number == team_num]
+            team_players = players_by_team.get(team_num)
             if team_players:
                 avg_rating = sum(mp.rating_mu_before for mp in team_players) / len(team_players)
                 teams_data[team_num] = TeamData(
@@ -333,20 +356,32 @@ class AdvancedRatingService:
         
         # Calculate rating changes for each player
         rating_changes = {}
+        match_player_updates = []
+        outcomes = []
+        
+        # Every team's opponent average is the match total minus its own rating
+        total_avg_rating = sum(t.avg_rating for t in teams_data.values())
+        opponent_count = len(teams_data) - 1
         
         for team_num, team_data in teams_data.items():
-            # Get opponent teams
-            opponent_teams = [t for t in teams_data.values() if t.team_number != team_num]
+            # Team-level factors are shared by every player on the team
+            base_score = cls.calculate_base_placement_score(team_data.placement)
+            if opponent_count > 0:
+                opponent_multiplier = cls.calculate_opponent_strength_multiplier_precomputed(
+                    team_data.avg_rating,
+                    (total_avg_rating - team_data.avg_rating) / opponent_count,
+                    team_data.placement
+                )
+            else:
+                opponent_multiplier = 1.0
             
             # Calculate changes for each player in this team
-            team_players = [mp for mp in match_players if mp.team_number == team_num]
-            
-            for match_player in team_players:
-                breakdown = cls.calculate_advanced_rating_change(
+            for match_player in players_by_team[team_num]:
+                breakdown = cls.calculate_player_rating_change(
                     player_rating=match_player.rating_mu_before,
                     team_avg_rating=team_data.avg_rating,
-                    placement=team_data.placement,
-                    opponent_teams=opponent_teams
+                    base_score=base_score,
+                    opponent_multiplier=opponent_multiplier
                 )
                 
                 # Apply rating change
@@ -354,34 +389,32 @@ class AdvancedRatingService:
                 new_sigma = max(match_player.rating_sigma_before * 0.99, 50.0)  # Gradual sigma reduction
                 
                 # Update match player record
-                match_player.rating_mu_after = new_rating
-                match_player.rating_sigma_after = new_sigma
-                match_player.result = PlayerResult.WIN if team_data.placement == 1 else PlayerResult.LOSS
+                match_player_updates.append({
+                    'match_id': match_player.match_id,
+                    'user_id': match_player.user_id,
+                    'rating_mu_after': new_rating,
+                    'rating_sigma_after': new_sigma,
+                    'result': PlayerResult.WIN if team_data.placement == 1 else PlayerResult.LOSS
+                })
                 
                 # Store breakdown for response
                 rating_changes[f"{match_player.user_id}"] = breakdown
                 
-                # Update user's main rating
-                user = db.query(User).filter(
-                    User.guild_id == match_player.guild_id,
-                    User.user_id == match_player.user_id
-                ).first()
-                
-                if user:
-                    user.rating_mu = new_rating
-                    user.rating_sigma = new_sigma
-                    
-                    # Update statistics
-                    if team_data.placement == 1:
-                        user.wins += 1
-                    else:
-                        user.losses += 1
-                    
-                    user.games_played += 1
+                # Queue the user's rating and statistics update
+                outcomes.append((match_player.user_id, new_rating, new_sigma, "win" if team_data.placement == 1 else "loss"))
+        
+        # Write all player changes with one executemany
+        db.bulk_update_mappings(MatchPlayer, match_player_updates)
+        
+        # Increment user statistics in SQL with one executemany, no user rows loaded
+        UserService.apply_match_outcomes(db, match.guild_id, outcomes)
         
         # Update match status
         match.status = "completed"
         match.result_type = "placement"
         
         db.commit()
+        
+        # Drop the participants' cached reads only once the new ratings are visible
+        UserService.invalidate_cached_users(match.guild_id, [outcome[0] for outcome in outcomes])
         return rating_changes
@@ -1,43 +1,58 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, literal, select, update
+from sqlalchemy.orm import Session, contains_eager, load_only, selectinload
 from database.models import Match, MatchPlayer, User, MatchStatus, ResultType, PlayerResult
 from schemas.match_schemas import MatchCreate, MatchPlayerCreate, MatchResultUpdate
+from services.user_service import UserService
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
+from collections import defaultdict
 
 class MatchService:
     @staticmethod
     def create_match(db: Session, match_data: MatchCreate) -> Match:
         """Create a new match"""
-        db_match = Match(**match_data.dict())
+        db_match = Match(**match_data.model_dump())
         db.add(db_match)
         db.commit()
         db.refresh(db_match)
         return db_match
     
     @staticmethod
-    def get_match(db: Session, match_id: UUID) -> Optional[Match]:
-        """Get match by match_id"""
-        return db.query(Match).filter(Match.match_id == match_id).first()
+    def get_match(db: Session, match_id: UUID, load_players: bool = False) -> Optional[Match]:
+        """Get match by match_id, optionally eager-loading its players"""
+        stmt = select(Match).where(Match.match_id == match_id)
+        if load_players:
+            stmt = stmt.options(selectinload(Match.players))
+        return db.execute(stmt).scalar_one_or_none()
+    
+    @staticmethod
+    def get_match_with_players(db: Session, match_id: UUID) -> Optional[Match]:
+        """Get match and its players with a single JOIN query"""
+        # .all() rather than .first(): a LIMIT would cut off the joined player rows
+        matches = db.query(Match).outerjoin(Match.players).options(
+            contains_eager(Match.players)
+        ).filter(Match.match_id == match_id).all()
+        return matches[0] if matches else None
     
     @staticmethod
     def get_guild_matches(db: Session, guild_id: int, limit: int = 50) -> List[Match]:
-        """Get recent matches for a guild (all statuses)"""
-        return db.query(Match).filter(
+        """Get recent matches for a guild (all statuses), with their players in one extra query"""
+        return db.query(Match).options(selectinload(Match.players)).filter(
             Match.guild_id == guild_id
         ).order_by(Match.created_at.desc()).limit(limit).all()
     
     @staticmethod
     def get_guild_completed_matches(db: Session, guild_id: int, limit: int = 50) -> List[Match]:
-        """Get only completed matches for a guild"""
-        return db.query(Match).filter(
+        """Get only completed matches for a guild, with their players in one extra query"""
+        return db.query(Match).options(selectinload(Match.players)).filter(
             Match.guild_id == guild_id,
             Match.status == MatchStatus.COMPLETED
         ).order_by(Match.created_at.desc()).limit(limit).all()
     
     @staticmethod
     def add_player_to_match(db: Session, match_id: UUID, player_data: MatchPlayerCreate) -> Optional[MatchPlayer]:
-        """Add a player to a match"""
+        """Add a player to a match (flushed, not committed)"""
         # Get user's current rating
         user = db.query(User).filter(
             User.guild_id == player_data.guild_id,
@@ -57,14 +72,13 @@ class MatchService:
         )
         
         db.add(db_match_player)
-        db.commit()
-        db.refresh(db_match_player)
+        db.flush()  # Caller commits, so a whole roster can be added in one transaction
         return db_match_player
     
     @staticmethod
     def get_match_players(db: Session, match_id: UUID) -> List[MatchPlayer]:
         """Get all players in a match"""
-        return db.query(MatchPlayer).filter(MatchPlayer.match_id == match_id).all()
+        return db.execute(select(MatchPlayer).where(MatchPlayer.match_id == match_id)).scalars().all()
     
     @staticmethod
     def cleanup_pending_matches_for_players(db: Session, player_ids: List[int], guild_id: int) -> int:
@@ -76,41 +90,42 @@ class MatchService:
             return 0
         
         # Find pending matches that involve any of these players
-        pending_matches = db.query(Match).join(MatchPlayer).filter(
+        match_ids = [row.match_id for row in db.query(Match.match_id).join(MatchPlayer).filter(
             Match.status == MatchStatus.PENDING,
             Match.guild_id == guild_id,
             MatchPlayer.user_id.in_(player_ids)
-        ).distinct().all()
+        ).distinct().all()]
         
-        cleanup_count = 0
-        for match in pending_matches:
-            # Cancel the pending match
-            match.status = MatchStatus.CANCELLED
-            match.result_type = ResultType.CANCELLED
-            match.end_time = datetime.utcnow()
+        if match_ids:
+            # Cancel the pending matches
+            db.execute(
+                update(Match).where(Match.match_id.in_(match_ids)).values(
+                    status=MatchStatus.CANCELLED,
+                    result_type=ResultType.CANCELLED,
+                    end_time=datetime.utcnow()
+                )
+            )
             
-            # Update all players in this match to cancelled state
-            match_players = db.query(MatchPlayer).filter(MatchPlayer.match_id == match.match_id).all()
-            for player in match_players:
-                player.result = PlayerResult.PENDING  # Keep as pending since never completed
+            # Update all players in these matches to cancelled state
+            db.execute(
+                update(MatchPlayer).where(MatchPlayer.match_id.in_(match_ids)).values(
+                    result=PlayerResult.PENDING  # Keep as pending since never completed
+                )
+            )
             
-            cleanup_count += 1
-        
-        if cleanup_count > 0:
             db.commit()
         
-        return cleanup_count
+        return len(match_ids)
     
     @staticmethod
     def update_match_result(db: Session, match_id: UUID, result_data: MatchResultUpdate) -> Optional[Match]:
         """Update match result and player outcomes"""
-        match = MatchService.get_match(db, match_id)
+        match = MatchService.get_match_with_players(db, match_id)
         if not match:
             return None
         
-        # Get players involved in this match for cleanup
-        players = MatchService.get_match_players(db, match_id)
-        player_ids = [p.user_id for p in players]
+        # Get ids of players involved in this match for cleanup
+        player_ids = [p.user_id for p in match.players]
         
         # Clean up any other pending matches for these players
         cleanup_count = MatchService.cleanup_pending_matches_for_players(db, player_ids, match.guild_id)
@@ -121,23 +136,31 @@ class MatchService:
         match.winning_team = result_data.winning_team
         match.end_time = datetime.utcnow()
         
-        # Update player results
-        for player in players:
-            if result_data.result_type == "win_loss":
-                if player.team_number == result_data.winning_team:
-                    player.result = PlayerResult.WIN
-                else:
-                    player.result = PlayerResult.LOSS
-            elif result_data.result_type == "draw":
-                player.result = PlayerResult.DRAW
-            elif result_data.result_type == "forfeit":
-                # All players lose in a forfeit (no winner)
-                player.result = PlayerResult.LOSS
-            elif result_data.result_type == "cancelled":
-                player.result = PlayerResult.PENDING
+        # Update player results with a single UPDATE
+        if result_data.result_type == "win_loss":
+            result_enum = MatchPlayer.result.type  # Bind the enum values through the column's Enum type
+            player_result = case(
+                (MatchPlayer.team_number == result_data.winning_team, literal(PlayerResult.WIN, result_enum)),
+                else_=literal(PlayerResult.LOSS, result_enum)
+            )
+        elif result_data.result_type == "draw":
+            player_result = PlayerResult.DRAW
+        elif result_data.result_type == "forfeit":
+            # All players lose in a forfeit (no winner)
+            player_result = PlayerResult.LOSS
+        elif result_data.result_type == "cancelled":
+            player_result = PlayerResult.PENDING
+        else:
+            player_result = None
+        
+        if player_result is not None:
+            db.execute(
+                update(MatchPlayer).where(MatchPlayer.match_id == match_id).values(result=player_result)
+            )
         
         db.commit()
         db.refresh(match)
+        UserService.invalidate_guild_stats(match.guild_id)
         return match
     
     @staticmethod
@@ -152,18 +175,28 @@ class MatchService:
         match.end_time = datetime.utcnow()
         
         # Update all players to cancelled state
-        players = MatchService.get_match_players(db, match_id)
-        for player in players:
-            player.result = PlayerResult.PENDING
+        db.execute(
+            update(MatchPlayer).where(MatchPlayer.match_id == match_id).values(result=PlayerResult.PENDING)
+        )
         
         db.commit()
         db.refresh(match)
+        UserService.invalidate_guild_stats(match.guild_id)  # Cancelling a completed match changes its players' stats
         return match
     
     @staticmethod
     def get_user_match_history(db: Session, guild_id: int, user_id: int, limit: int = 20) -> List[MatchPlayer]:
         """Get match history for a specific user (all statuses)"""
-        return db.query(MatchPlayer).filter(
+        # Only load the columns the history response uses
+        return db.query(MatchPlayer).options(load_only(
+            MatchPlayer.guild_id,
+            MatchPlayer.team_number,
+            MatchPlayer.rating_mu_before,
+            MatchPlayer.rating_sigma_before,
+            MatchPlayer.rating_mu_after,
+            MatchPlayer.rating_sigma_after,
+            MatchPlayer.result
+        )).filter(
             MatchPlayer.guild_id == guild_id,
             MatchPlayer.user_id == user_id
         ).join(Match).order_by(Match.created_at.desc()).limit(limit).all()
@@ -171,55 +204,69 @@ class MatchService:
     @staticmethod
     def get_user_completed_match_history(db: Session, guild_id: int, user_id: int, limit: int = 20):
         """Get only completed match history for a specific user with match date and teammate information"""
-        # Query both MatchPlayer and Match data
-        results = db.query(MatchPlayer, Match).filter(
-            MatchPlayer.guild_id == guild_id,
-            MatchPlayer.user_id == user_id
-        ).join(Match, MatchPlayer.match_id == Match.match_id).filter(
-            Match.status == MatchStatus.COMPLETED
-        ).order_by(Match.end_time.desc()).limit(limit).all()
+        # Query the MatchPlayer and Match columns as plain rows (no ORM instances)
+        rows = db.execute(
+            select(
+                MatchPlayer.user_id,
+                MatchPlayer.guild_id,
+                MatchPlayer.team_number,
+                MatchPlayer.team_placement,
+                MatchPlayer.rating_mu_before,
+                MatchPlayer.rating_sigma_before,
+                MatchPlayer.rating_mu_after,
+                MatchPlayer.rating_sigma_after,
+                MatchPlayer.result,
+                Match.match_id,
+                Match.start_time,
+                Match.end_time,
+                Match.status,
+                Match.result_type,
+                Match.total_teams
+            ).join(Match, MatchPlayer.match_id == Match.match_id).where(
+                MatchPlayer.guild_id == guild_id,
+                MatchPlayer.user_id == user_id,
+                Match.status == MatchStatus.COMPLETED
+            ).order_by(Match.end_time.desc()).limit(limit)
+        ).mappings().all()
         
-        # Convert to list of dictionaries with both player and match data
-        history = []
-        for match_player, match in results:
-            # Get teammates for this match (same team, different user)
-            teammates = db.query(MatchPlayer).join(User).filter(
-                MatchPlayer.match_id == match.match_id,
-                MatchPlayer.team_number == match_player.team_number,
+        # Fetch every teammate (with username) for all of these matches in one query
+        match_ids = [row['match_id'] for row in rows]
+        teammates_by_team = defaultdict(list)
+        if match_ids:
+            teammates = db.query(MatchPlayer.match_id, MatchPlayer.team_number, MatchPlayer.user_id, User.username).join(
+                User, and_(User.guild_id == MatchPlayer.guild_id, User.user_id == MatchPlayer.user_id)
+            ).filter(
+                MatchPlayer.match_id.in_(match_ids),
                 MatchPlayer.user_id != user_id,
                 MatchPlayer.guild_id == guild_id
             ).all()
-            
-            # Get teammate usernames
-            teammate_info = []
             for teammate in teammates:
-                teammate_user = db.query(User).filter(
-                    User.guild_id == guild_id,
-                    User.user_id == teammate.user_id
-                ).first()
-                if teammate_user:
-                    teammate_info.append({
-                        'user_id': teammate.user_id,
-                        'username': teammate_user.username
-                    })
-            
+                teammates_by_team[(teammate.match_id, teammate.team_number)].append({
+                    'user_id': teammate.user_id,
+                    'username': teammate.username
+                })
+        
+        # Convert to list of dictionaries with both player and match data
+        history = []
+        for row in rows:
             history.append({
-                'user_id': match_player.user_id,
-                'guild_id': match_player.guild_id,
-                'team_number': match_player.team_number if match_player.team_number is not None else 1,
-                'team_placement': match_player.team_placement,  # Add team placement for placement-based results
-                'rating_mu_before': match_player.rating_mu_before,
-                'rating_sigma_before': match_player.rating_sigma_before,
-                'rating_mu_after': match_player.rating_mu_after,
-                'rating_sigma_after': match_player.rating_sigma_after,
-                'result': match_player.result.value if match_player.result else 'unknown',
-                'match_id': str(match.match_id),  # Convert UUID to string for JSON serialization
-                'start_time': match.start_time.isoformat() if match.start_time else None,
-                'end_time': match.end_time.isoformat() if match.end_time else None,
-                'status': match.status.value if match.status else 'unknown',
-                'result_type': match.result_type.value if match.result_type else None,
-                'total_teams': match.total_teams,  # Add total teams in match
-                'teammates': teammate_info  # Include teammate information
+                'user_id': row['user_id'],
+                'guild_id': row['guild_id'],
+                'team_number': row['team_number'] if row['team_number'] is not None else 1,
+                'team_placement': row['team_placement'],  # Add team placement for placement-based results
+                'rating_mu_before': row['rating_mu_before'],
+                'rating_sigma_before': row['rating_sigma_before'],
+                'rating_mu_after': row['rating_mu_after'],
+                'rating_sigma_after': row['rating_sigma_after'],
+                'result': row['result'].value if row['result'] else 'unknown',
+                'match_id': str(row['match_id']),  # Convert UUID to string for JSON serialization
+                'start_time': row['start_time'].isoformat() if row['start_time'] else None,
+                'end_time': row['end_time'].isoformat() if row['end_time'] else None,
+                'status': row['status'].value if row['status'] else 'unknown',
+                'result_type': row['result_type'].value if row['result_type'] else None,
+                'total_teams': row['total_teams'],  # Add total teams in match
+                # Teammates for this match (same team, different user)
+                'teammates': teammates_by_team.get((row['match_id'], row['team_number']), [])
             })
         
         return history
@@ -238,6 +285,7 @@ class MatchService:
         
         db.delete(match_player)
         db.commit()
+        UserService.invalidate_guild_stats(guild_id)  # Removing a player from a completed match drops their result
         return True
     
     @staticmethod
@@ -254,29 +302,24 @@ class MatchService:
         
         match_player.team_number = new_team_number
         db.commit()
+        UserService.invalidate_guild_stats(guild_id)  # Keep cached stats consistent with the match rows
         return True
     
     @staticmethod
     def get_match_teams(db: Session, match_id: UUID) -> dict:
         """Get all teams in a match organized by team number"""
-        match_players = db.query(MatchPlayer).filter(MatchPlayer.match_id == match_id).all()
+        # Fetch players with their usernames in one query
+        match_players = db.query(MatchPlayer.user_id, MatchPlayer.team_number, User.username).outerjoin(
+            User, and_(User.guild_id == MatchPlayer.guild_id, User.user_id == MatchPlayer.user_id)
+        ).filter(MatchPlayer.match_id == match_id).all()
         
-        teams = {}
+        teams = defaultdict(list)
         for player in match_players:
             team_num = player.team_number
-            if team_num not in teams:
-                teams[team_num] = []
-            
-            # Get user info
-            user = db.query(User).filter(
-                User.guild_id == player.guild_id,
-                User.user_id == player.user_id
-            ).first()
-            
             teams[team_num].append({
                 'user_id': player.user_id,
-                'username': user.username if user else f'User {player.user_id}',
+                'username': player.username if player.username else f'User {player.user_id}',
                 'team_number': team_num
             })
         
-        return teams
\ No newline at end of file
+        return dict(teams)
\ No newline at end of file
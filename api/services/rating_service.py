@@ -1,9 +1,11 @@
 import math
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 from dataclasses import dataclass
 
 @dataclass
 class Rating:
+    __slots__ = ('mu', 'sigma')  # No per-instance __dict__; one of these is built per player per update
+    
     mu: float      # Skill estimate
     sigma: float   # Uncertainty
     
@@ -18,11 +20,15 @@ class GlickoRatingService:
         if not player_ratings:
             return Rating(1500.0, 350.0)
         
-        # Team mu = average of player mus
-        team_mu = sum(r.mu for r in player_ratings) / len(player_ratings)
+        # Accumulate mu and variance in a single pass over the team
+        total_mu = 0.0
+        combined_variance = 0.0
+        for r in player_ratings:
+            total_mu += r.mu
+            combined_variance += r.sigma * r.sigma
         
-        # Team sigma = combined uncertainty
-        combined_variance = sum(r.sigma ** 2 for r in player_ratings)
+        # Team mu = average of player mus, team sigma = combined uncertainty
+        team_mu = total_mu / len(player_ratings)
         team_sigma = math.sqrt(combined_variance) / len(player_ratings)
         
         return Rating(team_mu, team_sigma)
@@ -33,19 +39,26 @@ class GlickoRatingService:
         Update player ratings based on team performance
         team_results: 1.0 for win, 0.0 for loss, 0.5 for draw
         """
-        # Simplified Glicko-2 implementation for MVP
-        updated_ratings = []
-        
-        for rating, result in zip(player_ratings, team_results):
-            # Basic rating change calculation
-            rating_change = 32 * (result - 0.5) * (rating.sigma / 350.0)
-            
-            new_mu = rating.mu + rating_change
-            new_sigma = max(rating.sigma * 0.99, 50.0)  # Gradual sigma reduction
-            
-            updated_ratings.append(Rating(new_mu, new_sigma))
-        
-        return updated_ratings
+        # Simplified Glicko-2 implementation for MVP, run through the column-wise kernel
+        new_mus, new_sigmas = GlickoRatingService.update_ratings_vec(
+            [rating.mu for rating in player_ratings],
+            [rating.sigma for rating in player_ratings],
+            team_results
+        )
+        return [Rating(mu, sigma) for mu, sigma in zip(new_mus, new_sigmas)]
+    
+    @staticmethod
+    def update_ratings_vec(mus: Sequence[float], sigmas: Sequence[float],
+                           results: Sequence[float], k_factor: float = 32) -> Tuple[List[float], List[float]]:
+        """
+        Column-wise rating update kernel shared by the update_* methods
+        Takes parallel mu/sigma/result sequences and returns (new_mus, new_sigmas)
+        without allocating a Rating per player
+        """
+        new_mus = [mu + k_factor * (result - 0.5) * (sigma / 350.0)
+                   for mu, sigma, result in zip(mus, sigmas, results)]
+        new_sigmas = [max(sigma * 0.99, 50.0) for sigma in sigmas]
+        return new_mus, new_sigmas
     
     @staticmethod
     def update_team_ratings(team1_ratings: List[Rating], team2_ratings: List[Rating], 
@@ -69,18 +82,10 @@ class GlickoRatingService:
         rating_change = k_factor * (team1_score - expected_score)
         
         # Update team 1 players
-        team1_updated = []
-        for rating in team1_ratings:
-            new_mu = rating.mu + rating_change
-            new_sigma = max(rating.sigma * 0.99, 50.0)
-            team1_updated.append(Rating(new_mu, new_sigma))
+        team1_updated = [Rating(rating.mu + rating_change, max(rating.sigma * 0.99, 50.0)) for rating in team1_ratings]
         
         # Update team 2 players (opposite result)
-        team2_updated = []
-        for rating in team2_ratings:
-            new_mu = rating.mu - rating_change
-            new_sigma = max(rating.sigma * 0.99, 50.0)
-            team2_updated.append(Rating(new_mu, new_sigma))
+        team2_updated = [Rating(rating.mu - rating_change, max(rating.sigma * 0.99, 50.0)) for rating in team2_ratings]
         
         return team1_updated, team2_updated
     
@@ -99,14 +104,13 @@ class GlickoRatingService:
             # Calculate score based on position (1st place gets 1.0, last place gets 0.0)
             score = (num_teams - team_position) / (num_teams - 1) if num_teams > 1 else 0.5
             
-            # Simple rating update for multi-team scenario
-            updated_players = []
-            for rating in team_ratings:
-                rating_change = 20 * (score - 0.5) * (rating.sigma / 350.0)
-                new_mu = rating.mu + rating_change
-                new_sigma = max(rating.sigma * 0.99, 50.0)
-                updated_players.append(Rating(new_mu, new_sigma))
-            
-            updated_teams.append(updated_players)
+            # Simple rating update for multi-team scenario (smaller K-factor)
+            new_mus, new_sigmas = GlickoRatingService.update_ratings_vec(
+                [rating.mu for rating in team_ratings],
+                [rating.sigma for rating in team_ratings],
+                [score] * len(team_ratings),
+                k_factor=20
+            )
+            updated_teams.append([Rating(mu, sigma) for mu, sigma in zip(new_mus, new_sigmas)])
         
         return updated_teams
\ No newline at end of file
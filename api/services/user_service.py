@@ -1,16 +1,43 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, bindparam, case, func, select, update
+from sqlalchemy.orm import Session, aliased
 from database.models import User, Match, MatchPlayer, MatchStatus, PlayerResult
-from schemas.user_schemas import UserCreate, UserUpdate
-from typing import List, Optional
+from schemas.user_schemas import UserCreate, UserUpdate, user_to_response
+from utils.cache import TTLCache
+from typing import Iterable, List, Optional, Tuple
+from datetime import datetime
+
+# Current (mu, sigma) per (guild_id, user_id); entries are dropped whenever the user row is written
+_rating_cache = TTLCache(maxsize=4096, ttl=30)
+
+# Serialized UserResponse payloads per (guild_id, user_id), and guild listing pages per (guild_id, limit, after_user_id)
+_user_cache = TTLCache(maxsize=4096, ttl=30)
+_guild_users_cache = TTLCache(maxsize=1024, ttl=30)
+
+# (wins, losses, draws) increments per player result string
+_RESULT_INCREMENTS = {"win": (1, 0, 0), "loss": (0, 1, 0), "draw": (0, 0, 1)}
+
+def _result_increments(result: str) -> Tuple[int, int, int]:
+    """Look up a result's (wins, losses, draws) increments, rejecting anything but win/loss/draw"""
+    try:
+        return _RESULT_INCREMENTS[result]
+    except KeyError:
+        raise ValueError(f"Unknown match result: {result!r}") from None
+
+# Completed-match leaderboard rows per guild_id; dropped whenever a match result or a member's rating changes
+_guild_stats_cache = TTLCache(maxsize=256, ttl=300)
 
 class UserService:
     @staticmethod
     def create_user(db: Session, user_data: UserCreate) -> User:
         """Create a new user"""
-        db_user = User(**user_data.dict())
+        db_user = User(**user_data.model_dump())
         db.add(db_user)
+        db.flush()  # Applies column defaults to db_user
+        
+        # Detach so commit does not expire what the flush just set (no refresh SELECT)
+        db.expunge(db_user)
         db.commit()
-        db.refresh(db_user)
+        UserService.invalidate_cached_user(db_user.guild_id, db_user.user_id)
         return db_user
     
     @staticmethod
@@ -23,90 +50,166 @@ class UserService:
         ).first()
     
     @staticmethod
-    def get_guild_users(db: Session, guild_id: int) -> List[User]:
-        """Get all users in a guild (excludes soft-deleted users)"""
-        return db.query(User).filter(
+    def get_user_rating(db: Session, guild_id: int, user_id: int) -> Optional[dict]:
+        """Get a user's current rating, served from a short-lived in-process cache"""
+        key = (guild_id, user_id)
+        rating = _rating_cache.get(key)
+        if rating is None:
+            row = db.query(User.rating_mu, User.rating_sigma).filter(
+                User.guild_id == guild_id,
+                User.user_id == user_id,
+                User.deleted_at.is_(None)  # Exclude soft-deleted users
+            ).first()
+            if not row:
+                return None
+            
+            rating = {"rating_mu": row.rating_mu, "rating_sigma": row.rating_sigma}
+            _rating_cache.set(key, rating)
+        return rating
+    
+    @staticmethod
+    def get_user_response(db: Session, guild_id: int, user_id: int) -> Optional[dict]:
+        """Get a user serialized as a UserResponse payload, served from a short-lived in-process cache"""
+        key = (guild_id, user_id)
+        user = _user_cache.get(key)
+        if user is None:
+            db_user = UserService.get_user(db, guild_id, user_id)
+            if not db_user:
+                return None
+            
+            user = user_to_response(db_user)
+            _user_cache.set(key, user)
+        return user
+    
+    @staticmethod
+    def get_guild_user_responses(db: Session, guild_id: int, limit: int = 200, after_user_id: Optional[int] = None) -> List[dict]:
+        """Get a page of guild users serialized as UserResponse payloads, served from a short-lived in-process cache"""
+        key = (guild_id, limit, after_user_id)
+        page = _guild_users_cache.get(key)
+        if page is None:
+            page = [user_to_response(user) for user in UserService.get_guild_users(db, guild_id, limit, after_user_id)]
+            _guild_users_cache.set(key, page)
+        return page
+    
+    @staticmethod
+    def invalidate_cached_user(guild_id: int, user_id: int) -> None:
+        """Drop everything cached about a user, and their guild's cached listings, after the user row is written"""
+        _rating_cache.pop((guild_id, user_id))
+        _user_cache.pop((guild_id, user_id))
+        _guild_users_cache.pop_where(lambda key: key[0] == guild_id)
+        _guild_stats_cache.pop(guild_id)
+    
+    @staticmethod
+    def invalidate_cached_users(guild_id: int, user_ids: Iterable[int]) -> None:
+        """Drop everything cached about several users of one guild, after a bulk write has committed"""
+        for user_id in user_ids:
+            _rating_cache.pop((guild_id, user_id))
+            _user_cache.pop((guild_id, user_id))
+        _guild_users_cache.pop_where(lambda key: key[0] == guild_id)
+        _guild_stats_cache.pop(guild_id)
+    
+    @staticmethod
+    def invalidate_guild_stats(guild_id: int) -> None:
+        """Drop a guild's cached completed-match stats after matches or members change"""
+        _guild_stats_cache.pop(guild_id)
+    
+    @staticmethod
+    def get_guild_users(db: Session, guild_id: int, limit: int = 200, after_user_id: Optional[int] = None) -> List[User]:
+        """Get a page of users in a guild ordered by user_id (excludes soft-deleted users)"""
+        query = db.query(User).filter(
             User.guild_id == guild_id,
             User.deleted_at.is_(None)  # Exclude soft-deleted users
-        ).all()
+        )
+        
+        # Keyset pagination: continue after the last user_id of the previous page
+        if after_user_id is not None:
+            query = query.filter(User.user_id > after_user_id)
+        
+        return query.order_by(User.user_id).limit(limit).all()
     
     @staticmethod
-    def get_guild_users_with_completed_stats(db: Session, guild_id: int) -> List[dict]:
-        """Get all users in a guild with statistics based only on COMPLETED matches (excludes soft-deleted users)"""
-        users = db.query(User).filter(
+    def _completed_stats_subquery(guild_id: int, user_id: Optional[int] = None):
+        """Per-user result counts over COMPLETED matches, aggregated in one GROUP BY"""
+        query = select(
+            MatchPlayer.user_id,
+            func.count().label('games_played'),
+            func.sum(case((MatchPlayer.result == PlayerResult.WIN, 1), else_=0)).label('wins'),
+            func.sum(case((MatchPlayer.result == PlayerResult.LOSS, 1), else_=0)).label('losses'),
+            func.sum(case((MatchPlayer.result == PlayerResult.DRAW, 1), else_=0)).label('draws')
+        ).join(Match).where(
+            MatchPlayer.guild_id == guild_id,
+            Match.status == MatchStatus.COMPLETED
+        )
+        if user_id is not None:
+            query = query.where(MatchPlayer.user_id == user_id)
+        
+        return query.group_by(MatchPlayer.user_id).subquery()
+    
+    @staticmethod
+    def _query_users_with_completed_stats(db: Session, guild_id: int, user_id: Optional[int] = None, leaderboard_order: bool = False):
+        """
+        Users joined to their completed-match counts (users without completed matches get zeros)
+        leaderboard_order sorts by rating, then games played, then user_id
+        """
+        stats = UserService._completed_stats_subquery(guild_id, user_id)
+        games_played = func.coalesce(stats.c.games_played, 0).label('games_played')  # From completed matches only
+        
+        # Plain column rows, laid out in response order; no User instances are built
+        query = db.query(
+            User.guild_id,
+            User.user_id,
+            User.username,
+            User.region_code,
+            User.rating_mu,
+            User.rating_sigma,
+            games_played,
+            func.coalesce(stats.c.wins, 0).label('wins'),                  # From completed matches only
+            func.coalesce(stats.c.losses, 0).label('losses'),              # From completed matches only
+            func.coalesce(stats.c.draws, 0).label('draws'),                # From completed matches only
+            User.created_at,
+            User.last_updated
+        ).outerjoin(
+            stats, stats.c.user_id == User.user_id
+        ).filter(
             User.guild_id == guild_id,
             User.deleted_at.is_(None)  # Exclude soft-deleted users
-        ).all()
+        )
+        if user_id is not None:
+            query = query.filter(User.user_id == user_id)
+        if leaderboard_order:
+            # Order by the label object itself, not a bare name the dialect would have to resolve
+            query = query.order_by(User.rating_mu.desc(), games_played.desc(), User.user_id)
         
-        result = []
-        for user in users:
-            # Calculate stats from completed matches only
-            completed_matches = db.query(MatchPlayer).filter(
-                MatchPlayer.guild_id == guild_id,
-                MatchPlayer.user_id == user.user_id
-            ).join(Match).filter(
-                Match.status == MatchStatus.COMPLETED
-            ).all()
-            
-            # Count results from completed matches
-            wins = len([m for m in completed_matches if m.result == PlayerResult.WIN])
-            losses = len([m for m in completed_matches if m.result == PlayerResult.LOSS])
-            draws = len([m for m in completed_matches if m.result == PlayerResult.DRAW])
-            games_played = len(completed_matches)
-            
-            user_dict = {
-                'guild_id': user.guild_id,
-                'user_id': user.user_id,
-                'username': user.username,
-                'region_code': user.region_code,
-                'rating_mu': user.rating_mu,
-                'rating_sigma': user.rating_sigma,
-                'games_played': games_played,  # From completed matches only
-                'wins': wins,                  # From completed matches only
-                'losses': losses,              # From completed matches only
-                'draws': draws,                # From completed matches only
-                'created_at': user.created_at,
-                'last_updated': user.last_updated
-            }
-            result.append(user_dict)
+        return query
+    
+    @staticmethod
+    def get_guild_users_with_completed_stats(db: Session, guild_id: int, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """
+        Get all users in a guild with statistics based only on COMPLETED matches (excludes soft-deleted users)
+        The full list is served from an in-process cache that match results and member writes invalidate;
+        passing limit/offset instead returns one leaderboard page, ordered by rating then games played
+        """
+        if limit is not None or offset:
+            rows = UserService._query_users_with_completed_stats(
+                db, guild_id, leaderboard_order=True
+            ).offset(offset).limit(limit).all()
+            return [dict(row._mapping) for row in rows]
         
-        return result
+        users = _guild_stats_cache.get(guild_id)
+        if users is None:
+            rows = UserService._query_users_with_completed_stats(db, guild_id).all()
+            users = [dict(row._mapping) for row in rows]
+            _guild_stats_cache.set(guild_id, users)
+        return users
     
     @staticmethod
     def get_user_with_completed_stats(db: Session, guild_id: int, user_id: int) -> Optional[dict]:
         """Get user with statistics based only on COMPLETED matches"""
-        user = UserService.get_user(db, guild_id, user_id)
-        if not user:
+        row = UserService._query_users_with_completed_stats(db, guild_id, user_id).first()
+        if not row:
             return None
         
-        # Calculate stats from completed matches only
-        completed_matches = db.query(MatchPlayer).filter(
-            MatchPlayer.guild_id == guild_id,
-            MatchPlayer.user_id == user_id
-        ).join(Match).filter(
-            Match.status == MatchStatus.COMPLETED
-        ).all()
-        
-        # Count results from completed matches
-        wins = len([m for m in completed_matches if m.result == PlayerResult.WIN])
-        losses = len([m for m in completed_matches if m.result == PlayerResult.LOSS])
-        draws = len([m for m in completed_matches if m.result == PlayerResult.DRAW])
-        games_played = len(completed_matches)
-        
-        return {
-            'guild_id': user.guild_id,
-            'user_id': user.user_id,
-            'username': user.username,
-            'region_code': user.region_code,
-            'rating_mu': user.rating_mu,
-            'rating_sigma': user.rating_sigma,
-            'games_played': games_played,  # From completed matches only
-            'wins': wins,                  # From completed matches only
-            'losses': losses,              # From completed matches only
-            'draws': draws,                # From completed matches only
-            'created_at': user.created_at,
-            'last_updated': user.last_updated
-        }
+        return dict(row._mapping)
     
     @staticmethod
     def update_user(db: Session, guild_id: int, user_id: int, update_data: UserUpdate) -> Optional[User]:
@@ -115,61 +218,128 @@ class UserService:
         if not user:
             return None
         
-        for field, value in update_data.dict(exclude_unset=True).items():
+        for field, value in update_data.model_dump(exclude_unset=True).items():
             setattr(user, field, value)
         
+        db.flush()  # Applies last_updated to user
+        
+        # Detach so commit does not expire what the flush just set (no refresh SELECT)
+        db.expunge(user)
         db.commit()
-        db.refresh(user)
+        UserService.invalidate_cached_user(guild_id, user_id)
         return user
     
+    @staticmethod
+    def _update_active_user(db: Session, guild_id: int, user_id: int, **values) -> Optional[User]:
+        """
+        UPDATE an active user's row and return it, or None if there is no such user
+        Uses UPDATE ... RETURNING where the dialect supports it, otherwise the UPDATE plus a primary-key fetch
+        """
+        statement = update(User).where(
+            User.guild_id == guild_id,
+            User.user_id == user_id,
+            User.deleted_at.is_(None)  # Exclude soft-deleted users
+        ).values(**values)
+        
+        if db.get_bind().dialect.update_returning:
+            return db.execute(statement.returning(User)).scalar_one_or_none()
+        
+        # No RETURNING (MySQL, SQLite < 3.35): fetch the updated row by primary key
+        if db.execute(statement).rowcount == 0:
+            return None
+        return db.get(User, (guild_id, user_id))
+    
     @staticmethod
     def update_user_rating(db: Session, guild_id: int, user_id: int, new_mu: float, new_sigma: float) -> Optional[User]:
-        """Update user's rating after a match"""
-        user = UserService.get_user(db, guild_id, user_id)
+        """Update user's rating after a match (single UPDATE ... RETURNING where supported, no preceding SELECT)"""
+        user = UserService._update_active_user(db, guild_id, user_id, rating_mu=new_mu, rating_sigma=new_sigma)
         if not user:
+            db.rollback()
             return None
         
-        user.rating_mu = new_mu
-        user.rating_sigma = new_sigma
-        
+        # Detach so commit does not expire the row just loaded
+        db.expunge(user)
         db.commit()
-        db.refresh(user)
+        UserService.invalidate_cached_user(guild_id, user_id)
         return user
     
     @staticmethod
     def update_user_stats(db: Session, guild_id: int, user_id: int, result: str) -> Optional[User]:
         """Update user's game statistics (legacy method - kept for compatibility)"""
-        user = UserService.get_user(db, guild_id, user_id)
+        # Increment in SQL so concurrent results for the same user cannot lose an update
+        wins, losses, draws = _result_increments(result)
+        user = UserService._update_active_user(
+            db, guild_id, user_id,
+            games_played=User.games_played + 1,
+            wins=User.wins + wins,
+            losses=User.losses + losses,
+            draws=User.draws + draws
+        )
         if not user:
+            db.rollback()
             return None
         
-        user.games_played += 1
-        
-        if result == "win":
-            user.wins += 1
-        elif result == "loss":
-            user.losses += 1
-        elif result == "draw":
-            user.draws += 1
-        
+        # Detach so commit does not expire the row just loaded
+        db.expunge(user)
         db.commit()
-        db.refresh(user)
+        UserService.invalidate_cached_user(guild_id, user_id)
         return user
     
+    @staticmethod
+    def apply_match_outcomes(db: Session, guild_id: int, outcomes: List[Tuple[int, float, float, str]]) -> int:
+        """
+        Apply a completed match to every participant with one executemany UPDATE
+        outcomes: (user_id, new_mu, new_sigma, result) per player; the caller commits, then calls
+        invalidate_cached_users so no read between the UPDATE and the commit can re-cache old values
+        Returns the number of users updated; raises ValueError before writing if a result is not win/loss/draw
+        """
+        if not outcomes:
+            return 0
+        
+        params = []
+        for user_id, new_mu, new_sigma, result in outcomes:
+            wins, losses, draws = _result_increments(result)
+            params.append({'uid': user_id, 'mu': new_mu, 'sigma': new_sigma, 'w': wins, 'l': losses, 'd': draws})
+        
+        users = User.__table__
+        updated = db.execute(
+            users.update().where(
+                users.c.guild_id == guild_id,
+                users.c.user_id == bindparam('uid'),
+                users.c.deleted_at.is_(None)  # Exclude soft-deleted users
+            ).values(
+                rating_mu=bindparam('mu'),
+                rating_sigma=bindparam('sigma'),
+                games_played=users.c.games_played + 1,
+                wins=users.c.wins + bindparam('w'),
+                losses=users.c.losses + bindparam('l'),
+                draws=users.c.draws + bindparam('d')
+            ),
+            params
+        )
+        return updated.rowcount
+    
     @staticmethod
     def delete_user(db: Session, guild_id: int, user_id: int) -> bool:
         """Soft delete a user from the database (preserves match history)"""
-        user = UserService.get_user(db, guild_id, user_id)
-        if not user:
-            return False
-        
         try:
-            # Soft delete: set deleted_at timestamp instead of actually deleting
-            from datetime import datetime
-            user.deleted_at = datetime.utcnow()
-            user.username = f"[DELETED] {user.username}"  # Mark as deleted in username
+            # Soft delete in one conditional UPDATE: set deleted_at instead of actually deleting
+            deleted = db.execute(
+                update(User).where(
+                    User.guild_id == guild_id,
+                    User.user_id == user_id,
+                    User.deleted_at.is_(None)  # Already-deleted users are not found
+                ).values(
+                    deleted_at=datetime.utcnow(),
+                    username="[DELETED] " + User.username  # Mark as deleted in username
+                )
+            )
+            if deleted.rowcount == 0:
+                db.rollback()
+                return False
             
             db.commit()
+            UserService.invalidate_cached_user(guild_id, user_id)
             return True
             
         except Exception as e:
@@ -179,94 +349,67 @@ class UserService:
     @staticmethod
     def get_user_teammate_stats(db: Session, guild_id: int, user_id: int, limit: int = 10):
         """Get two categories of teammate statistics for a user"""
-        from sqlalchemy import func, and_, case
+        # Aggregate per teammate in SQL: the user's row joined to same-team rows of completed matches
+        me = aliased(MatchPlayer)
+        mate = aliased(MatchPlayer)
+        
+        # Skill change only counts when both ratings are recorded
+        skill_change = case(
+            (and_(me.rating_mu_before.isnot(None), me.rating_mu_before != 0,
+                  me.rating_mu_after.isnot(None), me.rating_mu_after != 0),
+             me.rating_mu_after - me.rating_mu_before),
+            else_=0
+        )
         
-        # Get all matches where the user participated and completed
-        user_matches = db.query(
-            MatchPlayer.match_id, 
-            MatchPlayer.team_number, 
-            MatchPlayer.result,
-            MatchPlayer.team_placement,
-            MatchPlayer.rating_mu_before,
-            MatchPlayer.rating_mu_after
+        teammates = db.query(
+            User.username,
+            func.count().label('games_together'),
+            func.sum(case((me.result == PlayerResult.WIN, 1), else_=0)).label('wins_together'),
+            func.sum(case((me.team_placement == 1, 1), else_=0)).label('first_place_wins'),
+            func.sum(skill_change).label('total_skill_change')
+        ).select_from(me).join(
+            mate, and_(
+                mate.match_id == me.match_id,
+                mate.team_number == me.team_number,
+                mate.user_id != me.user_id,  # Exclude the user themselves
+                mate.guild_id == me.guild_id
+            )
+        ).join(
+            Match, Match.match_id == me.match_id
+        ).join(
+            User, and_(
+                User.guild_id == mate.guild_id,
+                User.user_id == mate.user_id,
+                User.deleted_at.is_(None)  # Exclude soft-deleted teammates
+            )
         ).filter(
-            MatchPlayer.guild_id == guild_id,
-            MatchPlayer.user_id == user_id
-        ).join(Match).filter(
+            me.guild_id == guild_id,
+            me.user_id == user_id,
             Match.status == MatchStatus.COMPLETED
-        ).all()
-        
-        # Create dictionaries to track teammate statistics
-        teammate_stats = {}
-        
-        for user_match_id, user_team_number, user_result, user_placement, rating_before, rating_after in user_matches:
-            # Find all other players who were on the same team in this match
-            teammates_in_match = db.query(MatchPlayer).filter(
-                MatchPlayer.match_id == user_match_id,
-                MatchPlayer.team_number == user_team_number,
-                MatchPlayer.user_id != user_id,  # Exclude the user themselves
-                MatchPlayer.guild_id == guild_id
-            ).all()
-            
-            # Calculate skill change for this match
-            skill_change = 0
-            if rating_after and rating_before:
-                skill_change = rating_after - rating_before
-            
-            # Track if this was a 1st place finish
-            is_first_place = user_placement == 1 if user_placement else False
-            
-            # Update statistics for each teammate
-            for teammate in teammates_in_match:
-                teammate_id = teammate.user_id
-                
-                if teammate_id not in teammate_stats:
-                    teammate_stats[teammate_id] = {
-                        'games_together': 0,
-                        'wins_together': 0,
-                        'first_place_wins': 0,
-                        'total_skill_change': 0
-                    }
-                
-                teammate_stats[teammate_id]['games_together'] += 1
-                teammate_stats[teammate_id]['total_skill_change'] += skill_change
-                
-                if user_result == PlayerResult.WIN:
-                    teammate_stats[teammate_id]['wins_together'] += 1
-                
-                if is_first_place:
-                    teammate_stats[teammate_id]['first_place_wins'] += 1
+        ).group_by(mate.user_id, User.username).all()
         
         # Create two separate result lists
         frequent_partners = []
         championship_partners = []
         
-        for teammate_id, stats in teammate_stats.items():
-            # Get teammate user info (exclude soft-deleted users)
-            teammate_user = db.query(User).filter(
-                User.guild_id == guild_id,
-                User.user_id == teammate_id,
-                User.deleted_at.is_(None)
-            ).first()
+        for teammate in teammates:
+            avg_skill_change = teammate.total_skill_change / teammate.games_together
+            win_rate = (teammate.wins_together / teammate.games_together * 100)
+            
+            # Most Frequent Partners (by games together)
+            frequent_partners.append({
+                'teammate_username': teammate.username,
+                'games_together': teammate.games_together,
+                'avg_skill_change': avg_skill_change
+            })
             
-            if teammate_user and stats['games_together'] > 0:
-                avg_skill_change = stats['total_skill_change'] / stats['games_together']
-                win_rate = (stats['wins_together'] / stats['games_together'] * 100)
-                
-                # Most Frequent Partners (by games together)
-                frequent_partners.append({
-                    'teammate_username': teammate_user.username,
-                    'games_together': stats['games_together'],
-                    'avg_skill_change': avg_skill_change
+            # Championship Partners (by 1st place wins)
+            if teammate.first_place_wins > 0:
+                championship_partners.append({
+                    'teammate_username': teammate.username,
+                    'first_place_wins': teammate.first_place_wins,
+                    'win_rate': win_rate
                 })
-                
-                # Championship Partners (by 1st place wins)
-                if stats['first_place_wins'] > 0:
-                    championship_partners.append({
-                        'teammate_username': teammate_user.username,
-                        'first_place_wins': stats['first_place_wins'],
-                        'win_rate': win_rate
-                    })
         
         # Sort both categories
         frequent_partners.sort(key=lambda x: x['games_together'], reverse=True)
@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database.models import Base
+from database.connection import get_db
+from services import user_service
+from main import app
+
+# Create test database
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def override_get_db():
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture(scope="session")
+def client():
+    """API client backed by a fresh test database shared by the whole test session"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+@pytest.fixture(autouse=True)
+def clear_user_caches():
+    """Start every test with empty in-process user caches so test order cannot leak cached reads"""
+    for cache in (
+        user_service._rating_cache,
+        user_service._user_cache,
+        user_service._guild_users_cache,
+        user_service._guild_stats_cache
+    ):
+        cache.clear()
+    yield
@@ -0,0 +1,62 @@
+import pytest
+from services.advanced_rating_service import AdvancedRatingService, TeamData
+
+OPPONENTS = [
+    TeamData(team_number=2, placement=0, avg_rating=1600.0, players=[]),
+    TeamData(team_number=3, placement=0, avg_rating=1400.0, players=[])
+]
+
+def test_base_placement_score_table():
+    assert AdvancedRatingService.calculate_base_placement_score(1) == 50
+    assert AdvancedRatingService.calculate_base_placement_score(8) == 0
+    assert AdvancedRatingService.calculate_base_placement_score(30) == -345
+
+    # Out-of-range placements clamp to the ends of the table
+    assert AdvancedRatingService.calculate_base_placement_score(0) == 50
+    assert AdvancedRatingService.calculate_base_placement_score(45) == -345
+
+def test_underdog_win():
+    breakdown = AdvancedRatingService.calculate_advanced_rating_change(1200.0, 1250.0, 1, OPPONENTS)
+    assert breakdown.base_score == 50
+    assert breakdown.opponent_multiplier == pytest.approx(1.4)
+    assert breakdown.final_change == pytest.approx(70.0)
+
+def test_elite_bad_placement():
+    breakdown = AdvancedRatingService.calculate_advanced_rating_change(2100.0, 1800.0, 25, OPPONENTS)
+    assert breakdown.opponent_multiplier == pytest.approx(0.4)
+    assert breakdown.individual_adjustment == pytest.approx(0.8)
+    assert breakdown.curve_multiplier == pytest.approx(1.5)
+    assert breakdown.final_change == pytest.approx(-105.6)
+
+def test_placement_adjustments():
+    # Winning against much weaker opponents reduces the reward further
+    weak = [TeamData(team_number=2, placement=0, avg_rating=1300.0, players=[])]
+    breakdown = AdvancedRatingService.calculate_advanced_rating_change(2000.0, 2000.0, 2, weak)
+    assert breakdown.opponent_multiplier == pytest.approx(0.14)
+    assert breakdown.final_change == pytest.approx(1.47)
+
+    # Losing badly to much stronger opponents is capped by the max change limit
+    strong = [TeamData(team_number=2, placement=0, avg_rating=1900.0, players=[])]
+    breakdown = AdvancedRatingService.calculate_advanced_rating_change(1000.0, 1500.0, 16, strong)
+    assert breakdown.opponent_multiplier == pytest.approx(2.34)
+    assert breakdown.preliminary_change == pytest.approx(-174.096)
+    assert breakdown.final_change == -150
+
+def test_no_opponents():
+    breakdown = AdvancedRatingService.calculate_advanced_rating_change(1500.0, 1500.0, 3, [])
+    assert breakdown.opponent_multiplier == 1.0
+    assert breakdown.final_change == pytest.approx(21.25)
+
+def test_preview_rating_changes():
+    previews = AdvancedRatingService.preview_rating_changes(1700.0, 1650.0, OPPONENTS)
+    assert list(previews) == [1, 3, 5, 10, 15, 20, 25, 30]
+    assert previews[1] == pytest.approx(21.0)
+    assert previews[10] == pytest.approx(-6.6)
+    assert previews[30] == pytest.approx(-150)
+
+def test_rating_tier_names():
+    assert AdvancedRatingService.get_rating_tier_name(2500) == "Legendary"
+    assert AdvancedRatingService.get_rating_tier_name(2000) == "Elite"
+    assert AdvancedRatingService.get_rating_tier_name(1599.9) == "Intermediate"
+    assert AdvancedRatingService.get_rating_tier_name(1000) == "Novice"
+    assert AdvancedRatingService.get_rating_tier_name(999) == "Learning"
@@ -0,0 +1,152 @@
+GUILD_ID = 777777777
+
+def create_match_with_players(client, user_ids, team_size=2):
+    """Register users and put them into a new match, team_size players per team"""
+    for user_id in user_ids:
+        client.post("/users/", json={
+            "guild_id": GUILD_ID,
+            "user_id": user_id,
+            "username": f"MatchUser{user_id}"
+        })
+
+    response = client.post("/matches/", json={
+        "guild_id": GUILD_ID,
+        "created_by": user_ids[0],
+        "total_teams": len(user_ids) // team_size
+    })
+    assert response.status_code == 200
+    match_id = response.json()["match_id"]
+
+    for i, user_id in enumerate(user_ids):
+        response = client.post(f"/matches/{match_id}/players", json={
+            "user_id": user_id,
+            "guild_id": GUILD_ID,
+            "team_number": i // team_size + 1
+        })
+        assert response.status_code == 200
+
+    return match_id
+
+def test_forfeit_result_updates_ratings(client):
+    user_ids = [200000001, 200000002, 200000003, 200000004]
+    match_id = create_match_with_players(client, user_ids)
+    before = {u: client.get(f"/users/{GUILD_ID}/{u}/rating").json()["rating_mu"] for u in user_ids}
+
+    response = client.put(f"/matches/{match_id}/result", json={"result_type": "forfeit"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["players_involved"] == 4
+    assert data["cleanup_performed"] is True
+
+    players = {p["user_id"]: p for p in client.get(f"/matches/{match_id}/players").json()}
+    for user_id in user_ids:
+        after = client.get(f"/users/{GUILD_ID}/{user_id}/rating").json()["rating_mu"]
+        assert players[user_id]["rating_mu_after"] == after
+        assert after < before[user_id]
+
+    user = client.get(f"/users/{GUILD_ID}/{user_ids[0]}").json()
+    assert user["losses"] == 1
+    assert user["games_played"] == 1
+
+def test_draw_result_keeps_ratings(client):
+    user_ids = [200000011, 200000012, 200000013, 200000014]
+    match_id = create_match_with_players(client, user_ids)
+
+    response = client.put(f"/matches/{match_id}/result", json={"result_type": "draw"})
+    assert response.status_code == 200
+
+    for player in client.get(f"/matches/{match_id}/players").json():
+        assert player["rating_mu_after"] == player["rating_mu_before"]
+        assert player["rating_sigma_after"] < player["rating_sigma_before"]
+
+def test_result_for_unknown_match(client):
+    response = client.put("/matches/00000000-0000-0000-0000-000000000000/result", json={
+        "result_type": "draw"
+    })
+    assert response.status_code == 404
+
+def test_completed_history_includes_teammates(client):
+    user_ids = [200000021, 200000022, 200000023, 200000024]
+    match_id = create_match_with_players(client, user_ids)
+    client.put(f"/matches/{match_id}/result", json={"result_type": "draw"})
+
+    response = client.get(f"/matches/user/{GUILD_ID}/{user_ids[0]}/completed")
+    assert response.status_code == 200
+    history = response.json()
+    assert len(history) == 1
+    assert history[0]["match_id"] == match_id
+    assert history[0]["teammates"] == [{"user_id": user_ids[1], "username": f"MatchUser{user_ids[1]}"}]
+
+def test_result_cancels_other_pending_matches(client):
+    user_ids = [200000031, 200000032, 200000033, 200000034]
+    stale_match_id = create_match_with_players(client, user_ids)
+    match_id = create_match_with_players(client, user_ids)
+
+    response = client.put(f"/matches/{match_id}/result", json={"result_type": "draw"})
+    assert response.status_code == 200
+
+    matches = {m["match_id"]: m for m in client.get(f"/matches/{GUILD_ID}").json()}
+    stale_match = matches[stale_match_id]
+    assert stale_match["status"] == "cancelled"
+    assert stale_match["result_type"] == "cancelled"
+    assert all(p["result"] == "pending" for p in stale_match["players"])
+
+    match = matches[match_id]
+    assert match["status"] == "completed"
+    assert all(p["result"] == "draw" for p in match["players"])
+
+def test_completed_stats_count_only_completed_matches(client):
+    user_ids = [200000041, 200000042, 200000043, 200000044]
+    match_id = create_match_with_players(client, user_ids)
+    client.put(f"/matches/{match_id}/result", json={"result_type": "draw"})
+    create_match_with_players(client, user_ids)  # Left pending
+
+    response = client.get(f"/users/{GUILD_ID}/{user_ids[0]}/completed-stats")
+    assert response.status_code == 200
+    stats = response.json()
+    assert (stats["games_played"], stats["wins"], stats["losses"], stats["draws"]) == (1, 0, 0, 1)
+
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert all(guild_stats[user_id]["draws"] == 1 for user_id in user_ids)
+
+def test_guild_stats_follow_results_and_cancellations(client):
+    user_ids = [200000051, 200000052, 200000053, 200000054]
+    match_id = create_match_with_players(client, user_ids)
+
+    # First read caches the guild's stats
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert guild_stats[user_ids[0]]["games_played"] == 0
+
+    client.put(f"/matches/{match_id}/result", json={"result_type": "forfeit"})
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert guild_stats[user_ids[0]]["games_played"] == 1
+    assert guild_stats[user_ids[0]]["rating_mu"] < 1500.0
+
+    client.delete(f"/matches/{match_id}")
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert guild_stats[user_ids[0]]["games_played"] == 0
+
+def test_completed_stats_leaderboard_page(client):
+    guild_stats = client.get(f"/users/{GUILD_ID}/completed-stats").json()
+    expected = sorted(guild_stats, key=lambda u: (u["rating_mu"], u["games_played"]), reverse=True)
+
+    response = client.get(f"/users/{GUILD_ID}/completed-stats", params={"limit": 3})
+    assert response.status_code == 200
+    assert [u["rating_mu"] for u in response.json()] == [u["rating_mu"] for u in expected[:3]]
+
+    response = client.get(f"/users/{GUILD_ID}/completed-stats", params={"limit": 3, "offset": 3})
+    assert [u["rating_mu"] for u in response.json()] == [u["rating_mu"] for u in expected[3:6]]
+
+def test_guild_stats_follow_player_removal(client):
+    user_ids = [200000061, 200000062, 200000063, 200000064]
+    match_id = create_match_with_players(client, user_ids)
+    client.put(f"/matches/{match_id}/result", json={"result_type": "draw"})
+
+    # First read caches the guild's stats
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert guild_stats[user_ids[0]]["games_played"] == 1
+
+    response = client.delete(f"/matches/{match_id}/players/{user_ids[0]}", params={"guild_id": GUILD_ID})
+    assert response.status_code == 200
+    guild_stats = {u["user_id"]: u for u in client.get(f"/users/{GUILD_ID}/completed-stats").json()}
+    assert guild_stats[user_ids[0]]["games_played"] == 0
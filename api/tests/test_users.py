@@ -1,31 +1,4 @@
-import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from database.models import Base
-from database.connection import get_db
-from main import app
-
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-client = TestClient(app)
-
-def test_create_user():
+def test_create_user(client):
     response = client.post("/users/", json={
         "guild_id": 123456789,
         "user_id": 987654321,
@@ -39,7 +12,7 @@ def test_create_user():
     assert data["rating_mu"] == 1500.0
     assert data["rating_sigma"] == 350.0
 
-def test_create_duplicate_user():
+def test_create_duplicate_user(client):
     # Create user first
     client.post("/users/", json={
         "guild_id": 123456789,
@@ -56,7 +29,7 @@ def test_create_duplicate_user():
     assert response.status_code == 400
     assert "User already exists" in response.json()["detail"]
 
-def test_get_user():
+def test_get_user(client):
     # Create user first
     client.post("/users/", json={
         "guild_id": 123456789,
@@ -71,12 +44,12 @@ def test_get_user():
     assert data["user_id"] == 987654323
     assert data["username"] == "TestUser3"
 
-def test_get_nonexistent_user():
+def test_get_nonexistent_user(client):
     response = client.get("/users/123456789/999999999")
     assert response.status_code == 404
     assert "User not found" in response.json()["detail"]
 
-def test_update_user():
+def test_update_user(client):
     # Create user first
     client.post("/users/", json={
         "guild_id": 123456789,
@@ -94,7 +67,7 @@ def test_update_user():
     assert data["username"] == "UpdatedUser4"
     assert data["region_code"] == "EU"
 
-def test_get_guild_users():
+def test_get_guild_users(client):
     # Create multiple users in the same guild
     client.post("/users/", json={
         "guild_id": 555555555,
@@ -116,14 +89,79 @@ def test_get_guild_users():
     assert "GuildUser1" in usernames
     assert "GuildUser2" in usernames
 
-def test_api_root():
+def test_get_guild_users_pagination(client):
+    for user_id in (222222221, 222222222, 222222223):
+        client.post("/users/", json={
+            "guild_id": 666666666,
+            "user_id": user_id,
+            "username": f"PagedUser{user_id}"
+        })
+    
+    # First page
+    response = client.get("/users/666666666", params={"limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [user["user_id"] for user in data] == [222222221, 222222222]
+    assert response.headers["X-Next-Cursor"] == "222222222"
+    
+    # Next page continues after the last user_id; a short page has no cursor
+    response = client.get("/users/666666666", params={"limit": 2, "after_user_id": response.headers["X-Next-Cursor"]})
+    assert response.status_code == 200
+    assert [user["user_id"] for user in response.json()] == [222222223]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_api_root(client):
     response = client.get("/")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "running"
 
-def test_health_check():
+def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
     data = response.json()
-    assert data["status"] == "healthy"
\ No newline at end of file
+    assert data["status"] == "healthy"
+
+def test_rating_reflects_updates(client):
+    client.post("/users/", json={
+        "guild_id": 123456789,
+        "user_id": 987654330,
+        "username": "RatedUser"
+    })
+    
+    # First read populates the rating cache
+    response = client.get("/users/123456789/987654330/rating")
+    assert response.json() == {"rating_mu": 1500.0, "rating_sigma": 350.0}
+    
+    # Writing a new rating invalidates it
+    client.put("/users/123456789/987654330/rating", params={"new_mu": 1620.0, "new_sigma": 300.0})
+    response = client.get("/users/123456789/987654330/rating")
+    assert response.json() == {"rating_mu": 1620.0, "rating_sigma": 300.0}
+    
+    # Soft-deleted users no longer have a rating
+    client.delete("/users/123456789/987654330")
+    response = client.get("/users/123456789/987654330/rating")
+    assert response.status_code == 404
+
+def test_user_reads_reflect_updates(client):
+    client.post("/users/", json={
+        "guild_id": 888888888,
+        "user_id": 987654331,
+        "username": "CachedUser"
+    })
+    
+    # First reads populate the user and guild listing caches
+    assert client.get("/users/888888888/987654331").json()["username"] == "CachedUser"
+    assert [user["username"] for user in client.get("/users/888888888").json()] == ["CachedUser"]
+    
+    # Profile and rating writes invalidate both
+    client.put("/users/888888888/987654331", json={"username": "RenamedUser"})
+    client.put("/users/888888888/987654331/rating", params={"new_mu": 1700.0, "new_sigma": 250.0})
+    data = client.get("/users/888888888/987654331").json()
+    assert (data["username"], data["rating_mu"]) == ("RenamedUser", 1700.0)
+    assert [user["username"] for user in client.get("/users/888888888").json()] == ["RenamedUser"]
+    
+    # Soft-deleted users disappear from both
+    client.delete("/users/888888888/987654331")
+    assert client.get("/users/888888888/987654331").status_code == 404
+    assert client.get("/users/888888888").json() == []
\ No newline at end of file
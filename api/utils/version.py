@@ -4,20 +4,25 @@ Version utilities for HP2BR Discord Bot API
 """
 
 import os
-import json
 import sys
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    # Fall back to the stdlib parser when utils is used outside the API's environment
+    from json import loads as _loads
+from functools import lru_cache
 from typing import Dict, Any
 
+# Root VERSION.json (the api directory's parent), resolved once at import
+_VERSION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "VERSION.json")
+
+@lru_cache(maxsize=1)
 def get_version_info() -> Dict[str, Any]:
-    """Get version information from root VERSION.json"""
-    # Get the root directory (parent of api directory)
-    api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    root_dir = os.path.dirname(api_dir)
-    version_file = os.path.join(root_dir, "VERSION.json")
-    
+    """Get version information from root VERSION.json (read once; clear this and get_version_string caches to reload)"""
     try:
-        with open(version_file, 'r') as f:
-            return json.load(f)
+        with open(_VERSION_FILE, 'rb') as f:
+            return _loads(f.read())
     except FileNotFoundError:
         return {
             "major": 1,
@@ -28,6 +33,7 @@ def get_version_info() -> Dict[str, Any]:
             "description": "Version file not found"
         }
 
+@lru_cache(maxsize=1)
 def get_version_string() -> str:
     """Get formatted version string"""
     info = get_version_info()
@@ -264,8 +264,9 @@ class UserCommands(commands.Cog):
                     except Exception as e:
                         logger.error(f"Error auto-registering {member.display_name}: {e}")
             
-            # Get users with completed match statistics (includes users with 0 completed matches)
-            users = await api_client.get_guild_users_completed_stats(interaction.guild.id)
+            # Get the top users with completed match statistics (includes users with 0 completed matches),
+            # already sorted by rating (mu) descending, then by games played descending
+            users = await api_client.get_guild_users_completed_stats(interaction.guild.id, limit=limit)
             
             if not users:
                 embed = EmbedTemplates.warning_embed(
@@ -278,12 +279,6 @@ class UserCommands(commands.Cog):
                 await interaction.followup.send(embed=embed)
                 return
             
-            # Sort by rating (mu) descending, then by games played descending
-            users.sort(key=lambda x: (x.get("rating_mu", 1500), x.get("games_played", 0)), reverse=True)
-            
-            # Limit results
-            users = users[:limit]
-            
             embed = EmbedTemplates.leaderboard_embed(
                 users=users,
                 guild_name=interaction.guild.name
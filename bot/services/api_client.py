@@ -86,14 +86,27 @@ class APIClient:
             
         return await self._make_request("PUT", f"/users/{guild_id}/{user_id}", json=data)
     
-    async def get_guild_users(self, guild_id: int) -> List[Dict]:
-        """Get all users in a guild (legacy method)"""
-        result = await self._make_request("GET", f"/users/{guild_id}")
-        return result if result is not None else []
-    
-    async def get_guild_users_completed_stats(self, guild_id: int) -> List[Dict]:
-        """Get all users in a guild with statistics based only on COMPLETED matches"""
-        result = await self._make_request("GET", f"/users/{guild_id}/completed-stats")
+    async def get_guild_users(self, guild_id: int, page_size: int = 200) -> List[Dict]:
+        """Get all users in a guild (legacy method), following the API's user_id pages until a short page"""
+        users = []
+        params = {"limit": page_size}
+        while True:
+            page = await self._make_request("GET", f"/users/{guild_id}", params=params)
+            if not page:
+                return users
+            
+            users.extend(page)
+            if len(page) < page_size:
+                return users
+            params = {"limit": page_size, "after_user_id": page[-1]["user_id"]}
+    
+    async def get_guild_users_completed_stats(self, guild_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get all users in a guild with statistics based only on COMPLETED matches
+        With a limit, returns only the top players by rating (then games played)
+        """
+        params = {"limit": limit} if limit is not None else None
+        result = await self._make_request("GET", f"/users/{guild_id}/completed-stats", params=params)
         return result if result is not None else []
     
     async def get_user_completed_stats(self, guild_id: int, user_id: int) -> Optional[Dict]:
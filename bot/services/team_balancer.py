@@ -1,7 +1,9 @@
+import asyncio
 import discord
 import random
 import logging
 import time
+from itertools import combinations
 from typing import List, Dict, Tuple, Any
 from services.api_client import api_client
 from utils.constants import Config
@@ -711,7 +713,7 @@ class TeamBalancer:
         if len(team_ratings) < 2:
             return 0.0
         
-        # Calculate variance of team ratings
+        # Calculate variance of team ratings (mean first, then squared deviations; avoids E[x^2] - E[x]^2 cancellation)
         mean_rating = sum(team_ratings) / len(team_ratings)
         variance = sum((rating - mean_rating) ** 2 for rating in team_ratings) / len(team_ratings)
         
@@ -725,21 +727,24 @@ class TeamBalancer:
         """
         # Start with snake draft
         best_teams = self._snake_draft_balance(players, num_teams)
-        best_score = self._calculate_balance_score([self._calculate_team_rating(team) for team in best_teams])
+        best_ratings = [self._calculate_team_rating(team) for team in best_teams]
+        best_score = self._calculate_balance_score(best_ratings)
         
         # Try to improve through random swaps
         for _ in range(max_iterations):
-            # Make a copy for testing
-            test_teams = [team.copy() for team in best_teams]
-            
             # Random swap between two teams
             team1_idx = random.randint(0, num_teams - 1)
             team2_idx = random.randint(0, num_teams - 1)
             
-            while team1_idx == team2_idx or not test_teams[team1_idx] or not test_teams[team2_idx]:
+            while team1_idx == team2_idx or not best_teams[team1_idx] or not best_teams[team2_idx]:
                 team1_idx = random.randint(0, num_teams - 1)
                 team2_idx = random.randint(0, num_teams - 1)
             
+            # Make a copy for testing, only duplicating the two teams being swapped
+            test_teams = best_teams.copy()
+            test_teams[team1_idx] = best_teams[team1_idx].copy()
+            test_teams[team2_idx] = best_teams[team2_idx].copy()
+            
             # Swap random players
             player1_idx = random.randint(0, len(test_teams[team1_idx]) - 1)
             player2_idx = random.randint(0, len(test_teams[team2_idx]) - 1)
@@ -750,12 +755,15 @@ class TeamBalancer:
             test_teams[team1_idx][player1_idx] = player2
             test_teams[team2_idx][player2_idx] = player1
             
-            # Check if this improves balance
-            test_ratings = [self._calculate_team_rating(team) for team in test_teams]
+            # Check if this improves balance, re-rating only the two swapped teams
+            test_ratings = best_ratings.copy()
+            test_ratings[team1_idx] = self._calculate_team_rating(test_teams[team1_idx])
+            test_ratings[team2_idx] = self._calculate_team_rating(test_teams[team2_idx])
             test_score = self._calculate_balance_score(test_ratings)
             
             if test_score < best_score:
                 best_teams = test_teams
+                best_ratings = test_ratings
                 best_score = test_score
                 logger.debug(f"Improved balance score to {best_score:.2f}")
         
@@ -1107,7 +1115,7 @@ class TeamBalancer:
         
         # Strategy 2: Greedy partnership avoidance (try multiple times with randomization)
         for attempt in range(3):  # Try greedy with different randomization
-            greedy_teams = self._greedy_partner_avoidance(players.copy(), num_teams, partnership_matrix, required_region)
+            greedy_teams = self._greedy_partner_avoidance(players, num_teams, partnership_matrix, required_region)
             greedy_score = self._calculate_partnership_penalty(greedy_teams, partnership_matrix, required_region)
             logger.debug(f"Greedy attempt {attempt + 1}: penalty score {greedy_score:.2f}")
             
@@ -1141,23 +1149,30 @@ class TeamBalancer:
         
         partnership_matrix = {}
         
-        for player in players:
+        # Hash lookups for partner resolution (first player wins on duplicate usernames)
+        user_ids_by_name = {}
+        for p in players:
+            user_ids_by_name.setdefault(p['username'], p['user_id'])
+        
+        # Fetch every player's teammate stats concurrently over the shared API session
+        all_teammate_stats = await asyncio.gather(*(
+            api_client.get_user_teammate_stats(
+                guild_id=guild_id,
+                user_id=player['user_id'],
+                limit=50  # Get more teammates for better data
+            )
+            for player in players
+        ), return_exceptions=True)
+        
+        for player, teammate_stats in zip(players, all_teammate_stats):
             try:
-                # Get teammate stats for this player
-                teammate_stats = await api_client.get_user_teammate_stats(
-                    guild_id=guild_id,
-                    user_id=player['user_id'],
-                    limit=50  # Get more teammates for better data
-                )
+                if isinstance(teammate_stats, Exception):
+                    raise teammate_stats
                 
                 if teammate_stats and 'frequent_partners' in teammate_stats:
                     for partner_data in teammate_stats['frequent_partners']:
                         # Find the partner in our current player list
-                        partner_user_id = None
-                        for p in players:
-                            if p['username'] == partner_data['teammate_username']:
-                                partner_user_id = p['user_id']
-                                break
+                        partner_user_id = user_ids_by_name.get(partner_data['teammate_username'])
                         
                         if partner_user_id:
                             # Create a sorted tuple for consistent key
@@ -1168,11 +1183,13 @@ class TeamBalancer:
                 logger.warning(f"Failed to get teammate stats for {player['username']}: {e}")
         
         logger.debug(f"Partnership matrix built: {len(partnership_matrix)} partnerships found")
-        for pair, count in partnership_matrix.items():
-            if count > 0:
-                player1_name = next(p['username'] for p in players if p['user_id'] == pair[0])
-                player2_name = next(p['username'] for p in players if p['user_id'] == pair[1])
-                logger.debug(f"  {player1_name} + {player2_name}: {count} games")
+        if logger.isEnabledFor(logging.DEBUG):
+            names_by_id = {}
+            for p in players:
+                names_by_id.setdefault(p['user_id'], p['username'])
+            for pair, count in partnership_matrix.items():
+                if count > 0:
+                    logger.debug(f"  {names_by_id[pair[0]]} + {names_by_id[pair[1]]}: {count} games")
         
         return partnership_matrix
     
@@ -1186,27 +1203,24 @@ class TeamBalancer:
         
         for team in teams:
             # Calculate penalty for this team
-            for i in range(len(team)):
-                for j in range(i + 1, len(team)):
-                    player1 = team[i]
-                    player2 = team[j]
-                    
-                    # Skip penalty if both are regional players (when region is required)
-                    if required_region:
-                        player1_regional = player1.get('region_code') == required_region
-                        player2_regional = player2.get('region_code') == required_region
-                        if player1_regional and player2_regional:
-                            continue
-                    
-                    # Get partnership count
-                    pair_key = tuple(sorted([player1['user_id'], player2['user_id']]))
-                    games_together = partnership_matrix.get(pair_key, 0)
-                    
-                    # Apply escalating penalty
-                    if games_together > 0:
-                        # Penalty increases exponentially with repeated partnerships
-                        penalty = games_together ** 1.5
-                        total_penalty += penalty
+            for player1, player2 in combinations(team, 2):
+                # Skip penalty if both are regional players (when region is required)
+                if required_region:
+                    player1_regional = player1.get('region_code') == required_region
+                    player2_regional = player2.get('region_code') == required_region
+                    if player1_regional and player2_regional:
+                        continue
+                
+                # Get partnership count
+                user_id1, user_id2 = player1['user_id'], player2['user_id']
+                pair_key = (user_id1, user_id2) if user_id1 < user_id2 else (user_id2, user_id1)
+                games_together = partnership_matrix.get(pair_key, 0)
+                
+                # Apply escalating penalty
+                if games_together > 0:
+                    # Penalty increases exponentially with repeated partnerships
+                    penalty = games_together ** 1.5
+                    total_penalty += penalty
         
         return total_penalty
     
@@ -1338,27 +1352,24 @@ class TeamBalancer:
             logger.info(f"Team {team_idx + 1}: {[p['username'] for p in team]}")
             
             team_partnerships = []
-            for i in range(len(team)):
-                for j in range(i + 1, len(team)):
-                    player1 = team[i]
-                    player2 = team[j]
+            for player1, player2 in combinations(team, 2):
+                user_id1, user_id2 = player1['user_id'], player2['user_id']
+                pair_key = (user_id1, user_id2) if user_id1 < user_id2 else (user_id2, user_id1)
+                games_together = partnership_matrix.get(pair_key, 0)
+                
+                if games_together > 0:
+                    # Check if this pair is exempt (both regional when region required)
+                    exempt = False
+                    if required_region:
+                        player1_regional = player1.get('region_code') == required_region  
+                        player2_regional = player2.get('region_code') == required_region
+                        exempt = player1_regional and player2_regional
                     
-                    pair_key = tuple(sorted([player1['user_id'], player2['user_id']]))
-                    games_together = partnership_matrix.get(pair_key, 0)
+                    status = " (exempt)" if exempt else ""
+                    team_partnerships.append(f"  {player1['username']} + {player2['username']}: {games_together} games{status}")
                     
-                    if games_together > 0:
-                        # Check if this pair is exempt (both regional when region required)
-                        exempt = False
-                        if required_region:
-                            player1_regional = player1.get('region_code') == required_region  
-                            player2_regional = player2.get('region_code') == required_region
-                            exempt = player1_regional and player2_regional
-                        
-                        status = " (exempt)" if exempt else ""
-                        team_partnerships.append(f"  {player1['username']} + {player2['username']}: {games_together} games{status}")
-                        
-                        if not exempt:
-                            total_repeated_partnerships += games_together
+                    if not exempt:
+                        total_repeated_partnerships += games_together
             
             if team_partnerships:
                 for partnership in team_partnerships:
@@ -205,6 +205,25 @@ class TestTeamBalancer:
         unbalanced_ratings = [1800.0, 1500.0, 1200.0]
         unbalanced_score = balancer._calculate_balance_score(unbalanced_ratings)
         assert unbalanced_score > 0.0
+    
+    def test_balance_score_for_known_split(self):
+        """Test balance score is the population standard deviation of team averages"""
+        from services.team_balancer import TeamBalancer
+        
+        balancer = TeamBalancer()
+        
+        # Snake split of 1800/1600/1500/1400/1300/1200 into three teams of two
+        teams = [
+            [{'rating_mu': 1800}, {'rating_mu': 1200}],
+            [{'rating_mu': 1600}, {'rating_mu': 1300}],
+            [{'rating_mu': 1500}, {'rating_mu': 1400}],
+        ]
+        team_ratings = [balancer._calculate_team_rating(team) for team in teams]
+        assert team_ratings == [1500.0, 1450.0, 1450.0]
+        assert balancer._calculate_balance_score(team_ratings) == pytest.approx(23.570226039551585, rel=1e-12)
+        
+        # Near-equal teams around 1500 still score their small spread exactly
+        assert balancer._calculate_balance_score([1500.0, 1500.001]) == pytest.approx(0.0005, rel=1e-9)
 
 class TestVoiceManager:
     """Test voice channel management"""